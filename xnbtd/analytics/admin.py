@@ -1,13 +1,23 @@
+from datetime import date
+
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+from django.forms.models import BaseInlineFormSet
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.utils.html import format_html
 
 from xnbtd.analytics.export import export_route_as_csv
+from xnbtd.analytics.reports import compute_profitability, whole_months
+from xnbtd.analytics.views import get_period, has_tours_permission
+from xnbtd.search import TypedSearchMixin
 
-from .models import Expense
+from .models import Expense, ExportJob, Tariff, TariffTier
 
 
-class ExpenseAdmin(admin.ModelAdmin):
+class ExpenseAdmin(TypedSearchMixin, admin.ModelAdmin):
     date_hierarchy = "date"
     list_display = (
         "title",
@@ -20,10 +30,11 @@ class ExpenseAdmin(admin.ModelAdmin):
     search_fields = [
         'title',
         'license_plate',
-        'amount',
-        'date',
         'linked_user__username',
     ]
+    search_number_fields = ['amount']
+    search_date_fields = ['date']
+    search_fulltext_fields = ['title']
     list_statistic = [
         ("amount", "Total des dépenses"),
     ]
@@ -64,11 +75,47 @@ class ExpenseAdmin(admin.ModelAdmin):
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
         extra_context["list_statistic"] = self.list_statistic
+        if self.has_financial_permission(request):
+            extra_context["profitability_url"] = reverse("admin:analytics_expense_profitability")
         return super().changelist_view(request, extra_context=extra_context)
 
     change_list_template = "xnbtd/admin/change_list.html"
     change_form_template = "xnbtd/admin/change_form.html"
 
+    def get_urls(self):
+        return [
+            path(
+                "profitability/",
+                self.admin_site.admin_view(self.profitability_view),
+                name="analytics_expense_profitability",
+            ),
+        ] + super().get_urls()
+
+    def has_financial_permission(self, request):
+        return request.user.is_superuser or request.user.has_perm("analytics.view_financial_data")
+
+    def profitability_view(self, request):
+        """Revenue, expenses and margin of each vehicle for each month of a period"""
+        if not self.has_financial_permission(request):
+            raise PermissionDenied
+
+        today = date.today()
+        start, end = whole_months(*get_period(request, date(today.year, 1, 1), today))
+        rows = compute_profitability(start, end)
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Rentabilité par véhicule",
+            "opts": self.model._meta,
+            "start": start,
+            "end": end,
+            "rows": rows,
+            "can_export_tours": has_tours_permission(request.user),
+            "revenue": round(sum(row.revenue for row in rows), 2),
+            "expenses": round(sum(row.expenses for row in rows), 2),
+            "margin": round(sum(row.margin for row in rows), 2),
+        }
+        return TemplateResponse(request, "xnbtd/admin/profitability.html", context)
+
     def response_change(self, request, obj):
         """Add custom actions to the change form"""
         if '_export_csv' in request.POST:
@@ -78,4 +125,111 @@ class ExpenseAdmin(admin.ModelAdmin):
         return super().response_change(request, obj)
 
 
+class TariffTierFormSet(BaseInlineFormSet):
+    """
+    Check the lines of the tiers against the carrier of the tariff
+
+    The check needs the tariff, which is not saved yet when it is created with its
+    tiers, so it is done here rather than in the model.
+    """
+
+    def clean(self):
+        super().clean()
+        lines = TariffTier.CARRIER_LINES.get(self.instance.carrier, [])
+        for form in self.forms:
+            if not form.has_changed() or (self.can_delete and self._should_delete_form(form)):
+                continue
+            line = form.cleaned_data.get("line")
+            if line and line not in lines:
+                form.add_error("line", "Cette ligne ne concerne pas le transporteur du tarif.")
+
+
+class TariffTierInline(admin.TabularInline):
+    model = TariffTier
+    formset = TariffTierFormSet
+    extra = 1
+    fields = ["line", "start", "unit_price"]
+
+
+class TariffAdmin(admin.ModelAdmin):
+    inlines = [TariffTierInline]
+    list_display = ("name", "carrier", "valid_from", "valid_until")
+    list_filter = ("carrier",)
+    date_hierarchy = "valid_from"
+
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "filename",
+        "content_type",
+        "requested_by",
+        "status",
+        "display_progress",
+        "created_at",
+        "display_download",
+    )
+    list_filter = ("status",)
+    fields = (
+        "filename",
+        "content_type",
+        "requested_by",
+        "status",
+        "display_progress",
+        "created_at",
+        "started_at",
+        "finished_at",
+        "error",
+        "display_download",
+    )
+    readonly_fields = fields
+
+    def display_progress(self, obj):
+        return f"{obj.rows_written} / {obj.total_rows} ({obj.progress} %)"
+
+    display_progress.short_description = "Avancement"
+
+    def display_download(self, obj):
+        if obj.status != ExportJob.DONE or not obj.file:
+            return "-"
+        url = reverse("admin:analytics_exportjob_download", args=[obj.pk])
+        return format_html('<a href="{}">Télécharger</a>', url)
+
+    display_download.short_description = "Fichier"
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request).select_related("content_type", "requested_by")
+        return qs if request.user.is_superuser else qs.filter(requested_by=request.user)
+
+    def has_module_permission(self, request):
+        # Every user may follow their own exports, get_queryset() hides the others
+        return True
+
+    def has_view_permission(self, request, obj=None):
+        return True
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:object_id>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="analytics_exportjob_download",
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, object_id):
+        """Send the file of a finished export"""
+        job = self.get_object(request, object_id)
+        if job is None or job.status != ExportJob.DONE or not job.file:
+            raise Http404
+        return FileResponse(job.file.open("rb"), as_attachment=True, filename=f"{job.filename}.csv")
+
+
 admin.site.register(Expense, ExpenseAdmin)
+admin.site.register(Tariff, TariffAdmin)
+admin.site.register(ExportJob, ExportJobAdmin)
@@ -6,3 +6,6 @@ class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'xnbtd.analytics'
     verbose_name = _('Analyses')
+
+    def ready(self):
+        from xnbtd.analytics import signals  # noqa:F401
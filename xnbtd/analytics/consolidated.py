@@ -0,0 +1,117 @@
+"""
+    Export of the tours of every carrier in a single file.
+
+    The five tour tables are read in one ``UNION ALL`` query on the columns they
+    share, each carrier mapping its own counters to the normalized counters of
+    ``COUNTERS`` (NULL when a carrier has no such counter). The rows are sorted
+    by the database and streamed by chunks.
+"""
+
+import csv
+
+from django.db.models import F, IntegerField, Value
+
+from xnbtd.analytics.export import EXPORT_CHUNK_SIZE, Echo
+from xnbtd.tours.models import (
+    GLS,
+    TNT,
+    TOUR_MODELS,
+    ChronopostDelivery,
+    ChronopostPickup,
+    Ciblex,
+)
+
+
+# Normalized counter -> column of each carrier
+COUNTERS = {
+    "points": {
+        GLS: "points_delivered",
+        ChronopostDelivery: "total_points",
+        TNT: "totals_clients",
+    },
+    "packages": {
+        GLS: "packages_delivered",
+        ChronopostDelivery: "charged_packages",
+    },
+    "pickups": {
+        GLS: "pickup_point",
+        ChronopostPickup: "picked_points",
+        TNT: "totals_clients_abductions",
+    },
+    # Ciblex is paid by the day, which is not a number of points
+    "worked_days": {
+        Ciblex: "days",
+    },
+    "distance": {
+        GLS: "full_km",
+        ChronopostDelivery: "full_km",
+        TNT: "kilometers",
+    },
+}
+
+COLUMNS = [
+    ("carrier", "Transporteur"),
+    ("tour_date", "Date"),
+    ("tour_name", "Numéro de tournée"),
+    ("driver", "Livreur"),
+    ("plate", "Plaque d'immatriculation"),
+    ("start", "Début"),
+    ("end", "Fin"),
+    ("worked", "Minutes travaillées"),
+    ("points", "Points"),
+    ("packages", "Colis"),
+    ("pickups", "Ramasses"),
+    ("worked_days", "Jours"),
+    ("distance", "Kilomètres"),
+]
+
+
+def carrier_rows(model, start, end, user=None):
+    """
+    Select the tours of a carrier in the columns of the consolidated export
+    """
+    queryset = model.objects.filter(date__gte=start, date__lte=end)
+    if user is not None:
+        queryset = queryset.filter(linked_user=user)
+
+    # Every column is an annotation, so the five SELECT lists match
+    columns = {
+        "carrier": Value(str(model._meta.verbose_name)),
+        "tour_date": F("date"),
+        "tour_name": F("name"),
+        "driver": F("linked_user__username"),
+        "plate": F("license_plate"),
+        "start": F("beginning_hour"),
+        "end": F("ending_hour"),
+        "worked": F("worked_minutes"),
+    }
+    for counter, carrier_columns in COUNTERS.items():
+        column = carrier_columns.get(model)
+        columns[counter] = F(column) if column else Value(None, output_field=IntegerField())
+    return queryset.order_by().annotate(**columns).values_list(*columns)
+
+
+def consolidated_rows(start, end, user=None):
+    """
+    Build the query reading the tours of every carrier over a period
+
+    Args:
+        start: The first day of the period
+        end: The last day of the period
+        user: Only read the tours of this driver, when given
+
+    Returns:
+        QuerySet: Tuples in the order of ``COLUMNS``, sorted by date, driver and carrier
+    """
+    first, *others = [carrier_rows(model, start, end, user) for model in TOUR_MODELS]
+    return first.union(*others, all=True).order_by("tour_date", "driver", "carrier", "start")
+
+
+def stream_consolidated_csv(start, end, user=None):
+    """
+    Generate the CSV lines of the consolidated export of a period
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for _, header in COLUMNS])
+    for row in consolidated_rows(start, end, user).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow(row)
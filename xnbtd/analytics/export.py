@@ -1,34 +1,102 @@
 import csv
+from dataclasses import dataclass
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import format_html, strip_tags
+from django.utils.safestring import SafeData
 
 
-def export_as_csv(modeladmin, request, queryset, fields=None, exclude=None, filename=None):
+# Rows fetched from the database at once while streaming an export
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
     """
-    Generic function to export a queryset as CSV
+    File-like object handing back what the csv writer writes, to stream the rows
+    """
+
+    def write(self, value):
+        return value
+
+
+@dataclass(frozen=True)
+class Column:
+    """
+    How to read a column of an export, resolved once before the rows are read
+
+    A column is read from the database with ``path`` when it has one, else from the
+    model instance with ``display`` (an admin display method) or ``attribute``.
+    """
+
+    header: str
+    path: str = None
+    display: object = None
+    attribute: str = None
+
+    def read(self, obj):
+        if self.display is not None:
+            value = self.display(obj)
+            if isinstance(value, SafeData):
+                # Display methods build HTML for the changelist
+                value = strip_tags(value.replace('<br>', '\n'))
+            return value
+        if self.path is not None:
+            value = obj
+            for name in self.path.split('__'):
+                value = getattr(value, name)
+                if value is None:
+                    return None
+            return value
+        value = getattr(obj, self.attribute, '')
+        return value() if callable(value) else value
+
+
+def build_column_plan(modeladmin, fields):
+    """
+    Resolve the exported fields into Columns
 
     Args:
         modeladmin: The ModelAdmin instance
-        request: The current request
-        queryset: The queryset to export
-        fields: List of field names to include (if None, all fields are included)
-        exclude: List of field names to exclude
-        filename: Custom filename (if None, model name is used)
+        fields: The exported field names, model fields or display methods of the admin
 
     Returns:
-        HttpResponse with CSV attachment
+        list: The Columns, in the order of the fields
     """
-    if not filename:
-        meta = modeladmin.model._meta
-        model_name = meta.verbose_name_plural.lower().replace(' ', '_')
-        date_str = timezone.now().strftime('%Y%m%d')
-        filename = f"{model_name}_{date_str}"
+    meta = modeladmin.model._meta
+    plan = []
+    for name in fields:
+        method = getattr(modeladmin, name, None)
+        if callable(method):
+            header = getattr(method, 'short_description', name)
+            plan.append(Column(header, display=method))
+            continue
+
+        try:
+            field = meta.get_field(name)
+        except FieldDoesNotExist:
+            plan.append(Column(name, attribute=name))
+            continue
+
+        if not field.is_relation:
+            plan.append(Column(field.verbose_name, path=field.attname))
+        elif field.many_to_one and hasattr(field.related_model, 'USERNAME_FIELD'):
+            # Users are written as their username
+            path = f'{field.name}__{field.related_model.USERNAME_FIELD}'
+            plan.append(Column(field.verbose_name, path=path))
+        else:
+            plan.append(Column(field.verbose_name, attribute=name))
+    return plan
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
 
-    # Get fields to export
+def get_export_fields(modeladmin, fields=None, exclude=None):
+    """
+    Get the exported field names: all the model fields and the display methods of
+    ``list_display`` by default, less the excluded ones
+    """
     if fields is None:
         fields = [field.name for field in modeladmin.model._meta.fields]
         # Add display methods that are in list_display
@@ -42,47 +110,72 @@ def export_as_csv(modeladmin, request, queryset, fields=None, exclude=None, file
 
     if exclude:
         fields = [f for f in fields if f not in exclude]
+    return fields
 
-    writer = csv.writer(response)
 
-    # Write header row with verbose field names
-    header = []
-    for field in fields:
-        if hasattr(modeladmin, field) and hasattr(getattr(modeladmin, field), 'short_description'):
-            header.append(getattr(getattr(modeladmin, field), 'short_description'))
-        else:
-            try:
-                header.append(modeladmin.model._meta.get_field(field).verbose_name)
-            except Exception:
-                header.append(field)
-
-    writer.writerow(header)
-
-    # Write data rows
-    for obj in queryset:
-        row = []
-        for field in fields:
-            if hasattr(modeladmin, field) and callable(getattr(modeladmin, field)):
-                # Call the display method and strip HTML tags
-                value = getattr(modeladmin, field)(obj)
-                # If the value is a SafeString (has HTML), convert to plain text
-                if hasattr(value, 'strip_tags'):
-                    from django.utils.html import strip_tags
-
-                    value = strip_tags(value)
-            else:
-                value = getattr(obj, field, '')
-                if callable(value):
-                    value = value()
-            row.append(value)
-        writer.writerow(row)
+def export_as_csv(modeladmin, request, queryset, fields=None, exclude=None, filename=None):
+    """
+    Generic function to export a queryset as CSV
+
+    Args:
+        modeladmin: The ModelAdmin instance
+        request: The current request
+        queryset: The queryset to export
+        fields: List of field names to include (if None, all fields are included)
+        exclude: List of field names to exclude
+        filename: Custom filename (if None, model name is used)
+
+    Returns:
+        StreamingHttpResponse with CSV attachment, the rows being written while they
+        are sent
+    """
+    if not filename:
+        meta = modeladmin.model._meta
+        model_name = meta.verbose_name_plural.lower().replace(' ', '_')
+        date_str = timezone.now().strftime('%Y%m%d')
+        filename = f"{model_name}_{date_str}"
 
+    plan = build_column_plan(modeladmin, get_export_fields(modeladmin, fields, exclude))
+    response = StreamingHttpResponse(stream_rows(queryset, plan), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
     return response
 
 
+def iter_rows(queryset, plan):
+    """
+    Read the cells of the exported rows, fetching the rows by chunks
+
+    Without display methods nor attributes in the plan, the rows are read as
+    ``values_list()`` tuples and no model instance is built.
+    """
+    if all(column.path is not None for column in plan):
+        values = queryset.prefetch_related(None).values_list(*(column.path for column in plan))
+        yield from values.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return
+
+    related = {column.path.split('__')[0] for column in plan if column.path and '__' in column.path}
+    if related:
+        queryset = queryset.select_related(*related)
+    for obj in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [column.read(obj) for column in plan]
+
+
+def stream_rows(queryset, plan):
+    """
+    Generate the CSV lines of an export
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow([column.header for column in plan])
+    for row in iter_rows(queryset, plan):
+        yield writer.writerow(row)
+
+
 def export_route_as_csv(modeladmin, request, queryset):
     """
     Action to export route data as CSV
+
+    Selections of more than ``EXPORT_JOB_THRESHOLD`` rows are exported in the
+    background, see ``xnbtd.analytics.jobs``.
     """
     # Exclude some fields that don't make sense in a CSV export
     exclude = ['id', 'comments']
@@ -91,6 +184,22 @@ def export_route_as_csv(modeladmin, request, queryset):
     model_name = modeladmin.model._meta.verbose_name_plural.lower().replace(' ', '_')
     filename = f"{model_name}_export_{timezone.now().strftime('%Y%m%d')}"
 
+    if queryset.count() > settings.EXPORT_JOB_THRESHOLD:
+        from xnbtd.analytics.jobs import enqueue_export
+
+        fields = get_export_fields(modeladmin, exclude=exclude)
+        job = enqueue_export(request, queryset, fields, filename)
+        modeladmin.message_user(
+            request,
+            format_html(
+                "L'export de {} lignes est en préparation, "
+                '<a href="{}">il sera téléchargeable ici</a>.',
+                job.total_rows,
+                reverse("admin:analytics_exportjob_change", args=[job.pk]),
+            ),
+        )
+        return None
+
     return export_as_csv(modeladmin, request, queryset, exclude=exclude, filename=filename)
 
 
@@ -0,0 +1,203 @@
+"""
+    Background CSV exports.
+
+    Large exports are recorded as ExportJob rows by the export action, then
+    written by the ``run_export_jobs`` command in a pool of worker processes, so no
+    message broker is needed. A job keeps the filters of the changelist rather
+    than the rows, which are only read by the worker. A job writes its file under
+    ``EXPORT_ROOT``, which is not served, with a random name, chunk by chunk,
+    saving its progress after each chunk. The file is then downloaded from the
+    admin, which checks that it belongs to the user. The command also fails the
+    jobs interrupted by the death of their worker and deletes the jobs and files
+    older than the retention period.
+"""
+
+import csv
+import os
+import uuid
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from xnbtd.analytics.export import EXPORT_CHUNK_SIZE, build_column_plan, iter_rows
+from xnbtd.analytics.models import ExportJob
+
+
+EXPORT_DIRECTORY = "exports"
+
+
+def get_export_ordering(queryset):
+    """
+    Get the ordering of an exported queryset, made total with the primary key
+    """
+    ordering = [
+        name
+        for name in queryset.query.order_by or queryset.model._meta.ordering
+        if isinstance(name, str)
+    ]
+    if not {"pk", "-pk", "id", "-id"} & set(ordering):
+        ordering.append("pk")
+    return ordering
+
+
+def enqueue_export(request, queryset, fields, filename):
+    """
+    Record the export of a queryset, to be written by the ``run_export_jobs`` command
+
+    The job keeps the query string of the changelist, from which ``write_export()``
+    reads the rows again. Only the primary keys of the rows checked on a page are
+    stored, their number being bounded by ``list_max_show_all``; when the action
+    applies to every row of the changelist, none are read here.
+
+    Args:
+        request: The request of the admin action asking for the export
+        queryset: The exported queryset
+        fields: The exported field names, see ``get_export_fields()``
+        filename: The name of the file, without extension
+
+    Returns:
+        ExportJob: The pending job
+    """
+    selected = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+    if request.POST.get("select_across") == "1":
+        selected = []
+    return ExportJob.objects.create(
+        content_type=ContentType.objects.get_for_model(queryset.model),
+        filters=dict(request.GET.lists()),
+        object_ids=selected,
+        ordering=get_export_ordering(queryset),
+        fields=fields,
+        filename=filename,
+        requested_by=request.user,
+        total_rows=queryset.count(),
+    )
+
+
+def get_job_queryset(job, modeladmin):
+    """
+    Rebuild the exported queryset of a job from the changelist of the user who asked
+    for the export
+    """
+    request = HttpRequest()
+    request.user = job.requested_by
+    request.GET = QueryDict(mutable=True)
+    for name, values in job.filters.items():
+        request.GET.setlist(name, values)
+    changelist = modeladmin.get_changelist_instance(request)
+    queryset = changelist.get_queryset(request)
+    if job.object_ids:
+        queryset = queryset.filter(pk__in=job.object_ids)
+    return queryset.order_by(*job.ordering)
+
+
+def claim_pending_jobs(limit):
+    """
+    Mark the oldest pending jobs as running, each job being claimed by one worker only
+
+    Returns:
+        list: The primary keys of the claimed jobs
+    """
+    pending = ExportJob.objects.filter(status=ExportJob.PENDING).order_by("created_at")
+    claimed = []
+    for pk in pending.values_list("pk", flat=True)[:limit]:
+        updated = ExportJob.objects.filter(pk=pk, status=ExportJob.PENDING).update(
+            status=ExportJob.RUNNING, started_at=timezone.now()
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def fail_stale_jobs():
+    """
+    Mark as failed the jobs running for longer than ``EXPORT_JOB_TIMEOUT``, whose
+    worker died without recording their outcome
+
+    Returns:
+        int: The number of failed jobs
+    """
+    now = timezone.now()
+    return ExportJob.objects.filter(
+        status=ExportJob.RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT),
+    ).update(status=ExportJob.FAILED, error="Export interrompu", finished_at=now)
+
+
+def delete_expired_jobs():
+    """
+    Delete the jobs finished for more than ``EXPORT_JOB_RETENTION_DAYS`` and their files
+
+    Returns:
+        int: The number of deleted jobs
+    """
+    limit = timezone.now() - timedelta(days=settings.EXPORT_JOB_RETENTION_DAYS)
+    expired = ExportJob.objects.filter(
+        status__in=[ExportJob.DONE, ExportJob.FAILED], finished_at__lt=limit
+    )
+    deleted = 0
+    for job in expired.only("pk", "file"):
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+    return deleted
+
+
+def write_export(job):
+    """
+    Write the file of a job, saving the progress after each chunk of rows
+
+    Returns:
+        str: The name of the file in the export storage
+    """
+    modeladmin = admin.site._registry[job.content_type.model_class()]
+    queryset = get_job_queryset(job, modeladmin)
+    plan = build_column_plan(modeladmin, job.fields)
+
+    # The name must not be guessed, the file is sent under the name of the job
+    name = f"{EXPORT_DIRECTORY}/{uuid.uuid4().hex}.csv"
+    path = job.file.storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as output:
+        writer = csv.writer(output)
+        writer.writerow([column.header for column in plan])
+        rows_written = 0
+        for rows_written, row in enumerate(iter_rows(queryset, plan), 1):
+            writer.writerow(row)
+            if rows_written % EXPORT_CHUNK_SIZE == 0:
+                ExportJob.objects.filter(pk=job.pk).update(rows_written=rows_written)
+        ExportJob.objects.filter(pk=job.pk).update(rows_written=rows_written)
+    return name
+
+
+def run_export_job(job_id):
+    """
+    Write the file of a claimed job and record its outcome
+
+    Returns:
+        str: The status of the job
+    """
+    job = ExportJob.objects.select_related("content_type", "requested_by").get(pk=job_id)
+    try:
+        name = write_export(job)
+    except Exception as error:
+        ExportJob.objects.filter(pk=job.pk).update(
+            status=ExportJob.FAILED, error=repr(error), finished_at=timezone.now()
+        )
+        return ExportJob.FAILED
+
+    ExportJob.objects.filter(pk=job.pk).update(
+        status=ExportJob.DONE, file=name, finished_at=timezone.now()
+    )
+    return ExportJob.DONE
+
+
+def init_worker():
+    # Worker processes started with "spawn" do not inherit the loaded apps
+    django.setup()
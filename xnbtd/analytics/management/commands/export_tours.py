@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from xnbtd.analytics.consolidated import stream_consolidated_csv
+
+
+class Command(BaseCommand):
+    help = "Export the tours of every carrier over a period in a single CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+        parser.add_argument("end", type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+        parser.add_argument("--output", help="Path of the CSV file, the standard output by default")
+
+    def handle(self, *args, **options):
+        lines = stream_consolidated_csv(options["start"], options["end"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
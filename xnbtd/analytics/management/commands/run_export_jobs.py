@@ -0,0 +1,77 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from xnbtd.analytics.jobs import (
+    claim_pending_jobs,
+    delete_expired_jobs,
+    fail_stale_jobs,
+    init_worker,
+    run_export_job,
+)
+
+
+# Seconds between two cleanups of the interrupted and expired jobs
+CLEANUP_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Write the files of the pending CSV exports, in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.EXPORT_JOB_WORKERS,
+            help="Number of worker processes, 0 to write the files in this process",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop once there is no pending export instead of waiting for new ones",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds between two checks for pending exports",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers == 0:
+            self.run(options, lambda job_ids: map(run_export_job, job_ids), 1)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+
+            def run_jobs(job_ids):
+                # The forked workers must not share the database connections of this process
+                connections.close_all()
+                return pool.map(run_export_job, job_ids)
+
+            self.run(options, run_jobs, workers)
+
+    def clean(self):
+        failed = fail_stale_jobs()
+        deleted = delete_expired_jobs()
+        if failed or deleted:
+            self.stdout.write(f"{failed} interrupted exports failed, {deleted} old exports deleted")
+
+    def run(self, options, run_jobs, batch_size):
+        cleaned_at = None
+        while True:
+            if cleaned_at is None or time.monotonic() - cleaned_at > CLEANUP_INTERVAL:
+                self.clean()
+                cleaned_at = time.monotonic()
+            job_ids = claim_pending_jobs(batch_size)
+            if job_ids:
+                for job_id, status in zip(job_ids, run_jobs(job_ids)):
+                    self.stdout.write(f"Export {job_id}: {status}")
+            elif options["once"]:
+                return
+            else:
+                time.sleep(options["interval"])
@@ -0,0 +1,96 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:01
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0002_alter_expense_options"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tariff",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, verbose_name="Nom")),
+                ("valid_from", models.DateField(verbose_name="En vigueur à partir du")),
+                (
+                    "valid_until",
+                    models.DateField(blank=True, null=True, verbose_name="Jusqu'au"),
+                ),
+            ],
+            options={
+                "verbose_name": "Tarif",
+                "verbose_name_plural": "Tarifs",
+                "ordering": ["-valid_from"],
+            },
+        ),
+        migrations.CreateModel(
+            name="TariffTier",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "line",
+                    models.CharField(
+                        choices=[
+                            ("delivered", "Colis livrés"),
+                            ("regular_pickup", "Colis ramassés réguliers"),
+                            ("eo", "Enlèvements occasionnels (EO)"),
+                            ("shd", "SHD"),
+                        ],
+                        max_length=32,
+                        verbose_name="Ligne",
+                    ),
+                ),
+                (
+                    "start",
+                    models.PositiveIntegerField(
+                        default=1,
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="À partir de l'unité",
+                    ),
+                ),
+                (
+                    "unit_price",
+                    models.DecimalField(
+                        decimal_places=3, max_digits=8, verbose_name="Prix unitaire"
+                    ),
+                ),
+                (
+                    "tariff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tiers",
+                        to="analytics.tariff",
+                        verbose_name="Tarif",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Palier",
+                "verbose_name_plural": "Paliers",
+                "ordering": ["line", "start"],
+                "unique_together": {("tariff", "line", "start")},
+            },
+        ),
+    ]
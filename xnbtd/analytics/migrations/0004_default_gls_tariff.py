@@ -0,0 +1,41 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import migrations
+
+
+# The prices used before tariffs were stored in the database
+DEFAULT_TIERS = [
+    ("delivered", 1, Decimal("3.17")),
+    ("delivered", 18672, Decimal("2.82")),
+    ("regular_pickup", 1, Decimal("1.52")),
+    ("eo", 1, Decimal("1.5")),
+    ("shd", 1, Decimal("3.17")),
+    ("shd", 2, Decimal("0.63")),
+    ("shd", 3, Decimal("0.32")),
+]
+
+
+def create_default_tariff(apps, schema_editor):
+    Tariff = apps.get_model("analytics", "Tariff")
+    TariffTier = apps.get_model("analytics", "TariffTier")
+    tariff = Tariff.objects.create(name="GLS", valid_from=date(2000, 1, 1))
+    TariffTier.objects.bulk_create(
+        TariffTier(tariff=tariff, line=line, start=start, unit_price=unit_price)
+        for line, start, unit_price in DEFAULT_TIERS
+    )
+
+
+def delete_default_tariff(apps, schema_editor):
+    Tariff = apps.get_model("analytics", "Tariff")
+    Tariff.objects.filter(name="GLS", valid_from=date(2000, 1, 1)).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0003_tariff"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_tariff, delete_default_tariff),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0004_default_gls_tariff"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tariff",
+            name="carrier",
+            field=models.CharField(
+                choices=[
+                    ("gls", "GLS"),
+                    ("chronopost_delivery", "Chronopost - Livraison"),
+                    ("chronopost_pickup", "Chronopost - Ramasse"),
+                    ("tnt", "TNT - Fedex"),
+                    ("ciblex", "Ciblex"),
+                ],
+                default="gls",
+                max_length=32,
+                verbose_name="Transporteur",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tarifftier",
+            name="line",
+            field=models.CharField(
+                choices=[
+                    ("delivered", "Colis livrés"),
+                    ("regular_pickup", "Colis ramassés réguliers"),
+                    ("eo", "Enlèvements occasionnels (EO)"),
+                    ("shd", "SHD"),
+                    ("total_points", "Points livrés"),
+                    ("picked_points", "Points ramassés"),
+                    ("totals_clients", "Clients"),
+                    ("days", "Jours"),
+                ],
+                max_length=32,
+                verbose_name="Ligne",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0005_tariff_carrier"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["date", "license_plate"], name="analytics_exp_date_plate_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from xnbtd.fulltext import create_fulltext_index, drop_fulltext_index
+
+
+def create_index(apps, schema_editor):
+    Expense = apps.get_model("analytics", "Expense")
+    create_fulltext_index(schema_editor, Expense._meta.db_table, "title")
+
+
+def drop_index(apps, schema_editor):
+    Expense = apps.get_model("analytics", "Expense")
+    drop_fulltext_index(schema_editor, Expense._meta.db_table, "title")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0006_expense_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
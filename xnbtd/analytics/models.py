@@ -1,7 +1,15 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils import formats
 
+from xnbtd.tours.models import CARRIER_MODELS
+
 
 class Expense(models.Model):
     """
@@ -34,3 +42,170 @@ class Expense(models.Model):
         permissions = [
             ("view_financial_data", "Can view financial data and pricing information"),
         ]
+        indexes = [
+            models.Index(fields=['date', 'license_plate'], name='analytics_exp_date_plate_idx'),
+        ]
+
+
+class Tariff(models.Model):
+    """
+    Prices of a carrier in force over a period, the tiers of each invoice line being
+    TariffTier rows
+    """
+
+    CARRIERS = [(code, model._meta.verbose_name) for code, model in CARRIER_MODELS.items()]
+
+    carrier = models.CharField(
+        max_length=32, choices=CARRIERS, default="gls", verbose_name="Transporteur"
+    )
+    name = models.CharField(max_length=255, verbose_name="Nom")
+    valid_from = models.DateField(verbose_name="En vigueur à partir du")
+    valid_until = models.DateField(verbose_name="Jusqu'au", null=True, blank=True)
+
+    def clean(self):
+        if self.valid_until and self.valid_until < self.valid_from:
+            raise ValidationError({"valid_until": "La fin de validité précède son début."})
+        overlapping = Tariff.objects.exclude(pk=self.pk).filter(
+            models.Q(valid_until__isnull=True) | models.Q(valid_until__gte=self.valid_from),
+            carrier=self.carrier,
+        )
+        if self.valid_until:
+            overlapping = overlapping.filter(valid_from__lte=self.valid_until)
+        if overlapping.exists():
+            raise ValidationError(
+                "Un autre tarif de ce transporteur est déjà en vigueur sur cette période."
+            )
+
+    def __str__(self):
+        formatted_date = formats.date_format(self.valid_from, format="j F Y")
+        return f"{self.get_carrier_display()} - {self.name} - {formatted_date}"
+
+    class Meta:
+        verbose_name = "Tarif"
+        verbose_name_plural = "Tarifs"
+        ordering = ['-valid_from']
+
+
+class TariffTier(models.Model):
+    """
+    Unit price of an invoice line from a given unit on
+
+    For volume lines the unit is the counted item of the month, for the SHD line it is
+    the position of the entry in its tour.
+    """
+
+    LINES = [
+        ("delivered", "Colis livrés"),
+        ("regular_pickup", "Colis ramassés réguliers"),
+        ("eo", "Enlèvements occasionnels (EO)"),
+        ("shd", "SHD"),
+        ("total_points", "Points livrés"),
+        ("picked_points", "Points ramassés"),
+        ("totals_clients", "Clients"),
+        ("days", "Jours"),
+    ]
+    # The lines each carrier can be invoiced on
+    CARRIER_LINES = {
+        "gls": ["delivered", "regular_pickup", "eo", "shd"],
+        "chronopost_delivery": ["total_points"],
+        "chronopost_pickup": ["picked_points"],
+        "tnt": ["totals_clients"],
+        "ciblex": ["days"],
+    }
+
+    tariff = models.ForeignKey(
+        Tariff, on_delete=models.CASCADE, related_name='tiers', verbose_name="Tarif"
+    )
+    line = models.CharField(max_length=32, choices=LINES, verbose_name="Ligne")
+    # Units are counted from 1, see CompiledTariff.amount()
+    start = models.PositiveIntegerField(
+        default=1, validators=[MinValueValidator(1)], verbose_name="À partir de l'unité"
+    )
+    unit_price = models.DecimalField(max_digits=8, decimal_places=3, verbose_name="Prix unitaire")
+
+    def __str__(self):
+        return f"{self.get_line_display()} ≥ {self.start}: {self.unit_price} €"
+
+    class Meta:
+        verbose_name = "Palier"
+        verbose_name_plural = "Paliers"
+        ordering = ['line', 'start']
+        unique_together = ['tariff', 'line', 'start']
+
+
+class ExportStorage(FileSystemStorage):
+    """
+    Storage of the export files in ``EXPORT_ROOT``, which is not served: the files
+    are only sent by the admin, to the user who asked for them
+    """
+
+    base_url = None
+
+    @property
+    def base_location(self):
+        return settings.EXPORT_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+class ExportJob(models.Model):
+    """
+    CSV export of a selection of rows, written in the background by the
+    ``run_export_jobs`` command
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "En attente"),
+        (RUNNING, "En cours"),
+        (DONE, "Terminé"),
+        (FAILED, "Échec"),
+    ]
+
+    content_type = models.ForeignKey(
+        "contenttypes.ContentType", on_delete=models.CASCADE, verbose_name="Données exportées"
+    )
+    # Query string of the changelist the rows are read from
+    filters = models.JSONField(default=dict)
+    # Primary keys of the rows checked on a changelist page, empty when every row
+    # of the changelist is exported
+    object_ids = models.JSONField(default=list)
+    ordering = models.JSONField(default=list)
+    fields = models.JSONField(default=list)
+    filename = models.CharField(max_length=255, verbose_name="Nom du fichier")
+    # The rows are read with the admin queryset of this user
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Demandé par")
+    status = models.CharField(
+        max_length=16, choices=STATUSES, default=PENDING, verbose_name="État"
+    )
+    total_rows = models.PositiveIntegerField(default=0, verbose_name="Lignes à exporter")
+    rows_written = models.PositiveIntegerField(default=0, verbose_name="Lignes exportées")
+    file = models.FileField(
+        upload_to="exports/", storage=ExportStorage(), blank=True, verbose_name="Fichier"
+    )
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Début")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+
+    @property
+    def progress(self):
+        if not self.total_rows:
+            return 100 if self.status == self.DONE else 0
+        return round(100 * self.rows_written / self.total_rows)
+
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Export"
+        verbose_name_plural = "Exports"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='analytics_export_status_idx'),
+        ]
@@ -0,0 +1,378 @@
+"""
+    Revenue computation for the tours.
+
+    Each carrier is invoiced on the monthly totals of some counters of its tours,
+    declared in ``CARRIERS``. The invoice of a month is computed from a single
+    aggregate query over the tours of that month, the tiers of the carrier tariff
+    in force on the first day of the month being applied afterwards on the totals.
+
+    Invoices are cached per month and filter scope. Each month has a version
+    token in the cache which is renewed by ``invalidate_month()`` when a tour of
+    the month changes, so only the cache of that month is dropped. Only the
+    basic cache API is used, so any Django cache backend works, but it must be
+    shared by the worker processes for the invalidation to reach all of them
+    (see ``CACHES`` in the settings): otherwise ``PRICING_CACHE_TIMEOUT`` bounds
+    how long another process serves a stale invoice.
+"""
+
+import hashlib
+import uuid
+from calendar import monthrange
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Count, DateField, F, Sum, Window
+from django.db.models.functions import RowNumber, TruncMonth
+
+from xnbtd.analytics.models import TariffTier
+from xnbtd.analytics.tariffs import get_tariff_schedule, get_tariffs_version
+from xnbtd.tours.models import CARRIER_MODELS, SHDEntry
+
+
+@dataclass(frozen=True)
+class Carrier:
+    code: str
+    model: type
+    # Invoice line code -> counter column summed for the line
+    lines: dict
+    # Whether the SHD entries of the tours are invoiced on an ``shd`` line
+    shd: bool = False
+
+
+# The counters each carrier is invoiced on, by carrier code
+INVOICE_LINES = {
+    "gls": {"delivered": "packages_delivered", "regular_pickup": "pickup_point", "eo": "eo"},
+    "chronopost_delivery": {"total_points": "total_points"},
+    "chronopost_pickup": {"picked_points": "picked_points"},
+    "tnt": {"totals_clients": "totals_clients"},
+    "ciblex": {"days": "days"},
+}
+
+CARRIERS = {
+    code: Carrier(code, model, INVOICE_LINES[code], shd=code == "gls")
+    for code, model in CARRIER_MODELS.items()
+}
+
+
+def get_carrier(model):
+    """
+    Get the Carrier invoicing the tours of a model, or None
+    """
+    for carrier in CARRIERS.values():
+        if carrier.model is model:
+            return carrier
+    return None
+
+
+@dataclass
+class InvoiceLine:
+    code: str
+    label: str
+    quantity: int
+    amount: float
+
+
+@dataclass
+class MonthInvoice:
+    year: int
+    month: int
+    tours: int = 0
+    tariff: str = None
+    lines: list = field(default_factory=list)
+
+    @property
+    def total(self):
+        return round(sum(line.amount for line in self.lines), 2)
+
+    def __getitem__(self, code):
+        for line in self.lines:
+            if line.code == code:
+                return line
+        raise KeyError(code)
+
+
+@dataclass
+class YearReport:
+    year: int
+    months: list = field(default_factory=list)
+
+    @property
+    def total(self):
+        return round(sum(invoice.total for invoice in self.months), 2)
+
+    @property
+    def tours(self):
+        return sum(invoice.tours for invoice in self.months)
+
+    @property
+    def lines(self):
+        """
+        The yearly total of each invoice line, in the order of the month lines
+        """
+        lines = {}
+        for invoice in self.months:
+            for line in invoice.lines:
+                total = lines.setdefault(line.code, InvoiceLine(line.code, line.label, 0, 0))
+                total.quantity += line.quantity
+                total.amount = round(total.amount + line.amount, 2)
+        return list(lines.values())
+
+
+def month_bounds(year, month):
+    """
+    Get the first and last day of a month
+
+    Args:
+        year: The year, as an int or a string
+        month: The month (1-12), as an int or a string
+
+    Returns:
+        tuple: ``(first_day, last_day)`` as dates
+
+    Raises:
+        ValueError: If the year or the month is not valid
+    """
+    year, month = int(year), int(month)
+    _, last_day = monthrange(year, month)
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def month_version_key(carrier, year, month):
+    return f"pricing:{carrier}:{int(year)}-{int(month):02d}:version"
+
+
+def get_month_version(carrier, year, month):
+    """
+    Get the cache version token of a month, creating it if needed
+    """
+    key = month_version_key(carrier, year, month)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+def invalidate_month(carrier, year, month):
+    """
+    Drop every cached pricing of a month by renewing its version token
+    """
+    cache.set(month_version_key(carrier, year, month), uuid.uuid4().hex, None)
+
+
+def get_cached_month_invoice(compute, queryset, year, month):
+    """
+    Get the invoice of a month from the cache, computing and storing it on a miss
+
+    Args:
+        compute: The function computing the invoice from ``(queryset, year, month)``
+        queryset: The queryset of tours holding the filter scope
+        year: The year to invoice
+        month: The month to invoice (1-12)
+
+    Returns:
+        MonthInvoice: The invoice of the month
+    """
+    carrier = get_carrier(queryset.model).code
+    first_day, _ = month_bounds(year, month)
+    try:
+        scope = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    except EmptyResultSet:
+        return compute(queryset, year, month)
+
+    version = get_month_version(carrier, first_day.year, first_day.month)
+    tariffs_version = get_tariffs_version()
+    key = f"pricing:{carrier}:{first_day:%Y-%m}:{version}:{tariffs_version}:{scope}"
+    invoice = cache.get(key)
+    if invoice is None:
+        invoice = compute(queryset, year, month)
+        cache.set(key, invoice, settings.PRICING_CACHE_TIMEOUT)
+    return invoice
+
+
+def get_totals(carrier):
+    """
+    Get the aggregates of the counters a carrier is invoiced on
+    """
+    totals = {"tours": Count("id")}
+    for code, column in carrier.lines.items():
+        totals[code] = Sum(column)
+    return totals
+
+
+def build_invoice(carrier, year, month, totals, tariff, shd=None):
+    """
+    Apply the tiers of a tariff to the aggregated totals of a month
+
+    Args:
+        carrier: The invoiced Carrier
+        year: The invoiced year
+        month: The invoiced month (1-12)
+        totals: The ``get_totals()`` aggregates over the tours of the month
+        tariff: The CompiledTariff in force, or None to leave the lines unpriced
+        shd: The ``(quantity, amount)`` of the SHD entries of the month, for the
+            carriers invoicing them
+
+    Returns:
+        MonthInvoice: The invoice with a line for each counter of the carrier
+    """
+    labels = dict(TariffTier.LINES)
+    lines = []
+    for code in carrier.lines:
+        quantity = totals[code] or 0
+        amount = tariff.amount(code, quantity) if tariff else 0
+        lines.append(InvoiceLine(code, labels[code], quantity, amount))
+    if carrier.shd:
+        quantity, amount = shd or (0, 0)
+        lines.append(InvoiceLine("shd", labels["shd"], quantity, round(amount, 2)))
+
+    return MonthInvoice(
+        year=year,
+        month=month,
+        tours=totals["tours"],
+        tariff=tariff.name if tariff else None,
+        lines=lines,
+    )
+
+
+def compute_month_invoice(queryset, year, month):
+    """
+    Compute every invoice line of a month of tours in a single query
+
+    The SHD entries are priced by ``sum_priced_shd_entries()`` in one more query
+    for the carriers invoicing them.
+
+    Args:
+        queryset: A queryset of tours of one carrier holding the filter scope
+        year: The year to invoice
+        month: The month to invoice (1-12)
+
+    Returns:
+        MonthInvoice: The invoice with a line for each counter of the carrier
+    """
+    carrier = get_carrier(queryset.model)
+    first_day, last_day = month_bounds(year, month)
+    tours = queryset.filter(date__gte=first_day, date__lte=last_day)
+    totals = tours.order_by().aggregate(**get_totals(carrier))
+    shd = sum_priced_shd_entries(tours)[0] if carrier.shd else None
+    tariff = get_tariff_schedule(carrier.code).at(first_day)
+    return build_invoice(carrier, first_day.year, first_day.month, totals, tariff, shd)
+
+
+def compute_year_report(queryset, year):
+    """
+    Compute the invoice of every month of a year in a single grouped query
+
+    The tiers are applied to each month separately, as they are on the invoices.
+    The SHD entries are priced by month in one more query for the carriers
+    invoicing them.
+
+    Args:
+        queryset: A queryset of tours of one carrier holding the filter scope
+        year: The year to report
+
+    Returns:
+        YearReport: The invoices of the twelve months, empty months included
+    """
+    carrier = get_carrier(queryset.model)
+    year = int(year)
+    totals = get_totals(carrier)
+    tours = queryset.filter(date__gte=date(year, 1, 1), date__lte=date(year, 12, 31))
+    rows = (
+        tours.order_by()
+        .annotate(period=TruncMonth("date"))
+        .values("period")
+        .annotate(**totals)
+    )
+    totals_per_month = {row["period"].month: row for row in rows}
+    shd_per_month = {}
+    if carrier.shd:
+        for period, quantity, amount in sum_priced_shd_entries(
+            tours, period=TruncMonth("gls__date")
+        ):
+            shd_per_month[DateField().to_python(period).month] = (quantity, amount)
+    empty = {name: 0 for name in totals}
+    schedule = get_tariff_schedule(carrier.code)
+    return YearReport(
+        year=year,
+        months=[
+            build_invoice(
+                carrier,
+                year,
+                month,
+                totals_per_month.get(month, empty),
+                schedule.at(date(year, month, 1)),
+                shd_per_month.get(month),
+            )
+            for month in range(1, 13)
+        ],
+    )
+
+
+def get_month_invoice(queryset, year, month):
+    """
+    Get the invoice of a month of tours, from the cache when possible
+    """
+    return get_cached_month_invoice(compute_month_invoice, queryset, year, month)
+
+
+def priced_shd_entries(queryset):
+    """
+    Annotate the SHD entries of GLS tours with their ``unit_price``
+
+    The entries of each tour are ranked by number with a window function, the
+    rank and the date of the tour selecting the unit price of the entry.
+
+    Args:
+        queryset: A GLS queryset
+
+    Returns:
+        QuerySet: The SHD entries of the tours
+    """
+    return (
+        SHDEntry.objects.filter(gls__in=queryset.order_by().values("pk"))
+        .order_by()
+        .annotate(
+            position=Window(RowNumber(), partition_by=F("gls"), order_by=F("number").asc())
+        )
+        .annotate(
+            unit_price=get_tariff_schedule("gls").unit_price("shd", "position", "gls__date")
+        )
+    )
+
+
+def sum_priced_shd_entries(queryset, **groups):
+    """
+    Sum the values and the prices of the SHD entries of GLS tours in a single query
+
+    The rank of an entry is a window function, which SQL does not allow inside an
+    aggregate, so the priced entries are read as a derived table summed by the
+    outer query.
+
+    Args:
+        queryset: A GLS queryset
+        **groups: Expressions over the entries to group the sums by
+
+    Returns:
+        list: ``(*groups, quantity, amount)`` tuples, a single one without groups
+    """
+    entries = (
+        priced_shd_entries(queryset)
+        .annotate(**groups, amount=F("unit_price") * F("value"))
+        .values_list(*groups, "value", "amount")
+    )
+    sql, params = entries.query.sql_with_params()
+    columns = ", ".join(groups)
+    select = f"{columns}, " if groups else ""
+    group_by = f" GROUP BY {columns}" if groups else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {select}SUM(value), SUM(amount) FROM ({sql}) entries{group_by}", params
+        )
+        rows = cursor.fetchall()
+    # The raw cursor skips the converters of the backend
+    return [(*row[:-2], int(row[-2] or 0), float(row[-1] or 0)) for row in rows]
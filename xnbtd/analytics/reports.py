@@ -0,0 +1,138 @@
+"""
+    Reports combining the tours and the expenses.
+"""
+
+from calendar import monthrange
+from dataclasses import dataclass
+
+from django.db.models import DateField, F, Sum
+from django.db.models.functions import TruncMonth
+
+from xnbtd.analytics.models import Expense
+from xnbtd.analytics.pricing import CARRIERS, build_invoice, get_totals, sum_priced_shd_entries
+from xnbtd.analytics.tariffs import get_tariff_schedule
+from xnbtd.tours.models import GLS
+
+
+@dataclass
+class ProfitabilityRow:
+    license_plate: str
+    month: object
+    tours: int = 0
+    revenue: float = 0
+    expenses: float = 0
+
+    @property
+    def margin(self):
+        return round(self.revenue - self.expenses, 2)
+
+
+def whole_months(start, end):
+    """
+    Widen a period to the first day of its first month and the last day of its last month
+    """
+    return start.replace(day=1), end.replace(day=monthrange(end.year, end.month)[1])
+
+
+def shd_revenue(start, end):
+    """
+    Sum the price of the SHD entries of the GLS tours by license plate and month
+
+    The entries are priced like on the GLS invoice (see ``sum_priced_shd_entries()``),
+    a single row being read per plate and month.
+
+    Returns:
+        list: ``(license plate, month, amount)`` tuples
+    """
+    rows = sum_priced_shd_entries(
+        GLS.objects.filter(date__gte=start, date__lte=end),
+        plate=F("gls__license_plate"),
+        period=TruncMonth("gls__date"),
+    )
+    # SQLite returns text dates to the raw cursor
+    return [
+        (license_plate, DateField().to_python(month), amount)
+        for license_plate, month, _, amount in rows
+    ]
+
+
+def compute_profitability(start, end):
+    """
+    Compute the revenue, the expenses and the margin of each vehicle for each month
+
+    The tours and the expenses are aggregated by license plate and month in the
+    database, with one grouped query per carrier and one for the expenses. Tiers
+    apply to the whole fleet, so the invoice of each carrier month is spread over
+    the vehicles at the average unit price of each invoice line. The tier
+    thresholds are monthly, so the period is widened to whole months. The SHD
+    entries of the GLS tours are priced with the same query as the SHD line of the
+    GLS invoice, summed by plate and month (see ``shd_revenue()``).
+
+    Args:
+        start: The first day of the period
+        end: The last day of the period
+
+    Returns:
+        list: ``ProfitabilityRow`` items sorted by license plate and month
+    """
+    start, end = whole_months(start, end)
+    rows = {}
+
+    def get_row(license_plate, month):
+        key = (license_plate.upper(), month)
+        if key not in rows:
+            rows[key] = ProfitabilityRow(*key)
+        return rows[key]
+
+    for carrier in CARRIERS.values():
+        totals = get_totals(carrier)
+        per_vehicle = list(
+            carrier.model.objects.filter(date__gte=start, date__lte=end)
+            .order_by()
+            .annotate(period=TruncMonth("date"))
+            .values("license_plate", "period")
+            .annotate(**totals)
+        )
+
+        fleet_totals = {}
+        for vehicle in per_vehicle:
+            month_totals = fleet_totals.setdefault(vehicle["period"], dict.fromkeys(totals, 0))
+            for name in totals:
+                month_totals[name] += vehicle[name] or 0
+
+        schedule = get_tariff_schedule(carrier.code)
+        unit_prices = {}
+        for month, month_totals in fleet_totals.items():
+            tariff = schedule.at(month)
+            invoice = build_invoice(carrier, month.year, month.month, month_totals, tariff)
+            unit_prices[month] = {
+                line.code: line.amount / line.quantity if line.quantity else 0
+                for line in invoice.lines
+                if line.code in carrier.lines
+            }
+
+        for vehicle in per_vehicle:
+            row = get_row(vehicle["license_plate"], vehicle["period"])
+            row.tours += vehicle["tours"]
+            row.revenue += sum(
+                (vehicle[code] or 0) * unit_price
+                for code, unit_price in unit_prices[vehicle["period"]].items()
+            )
+
+    for license_plate, month, amount in shd_revenue(start, end):
+        get_row(license_plate, month).revenue += amount
+
+    expenses = (
+        Expense.objects.filter(date__gte=start, date__lte=end)
+        .order_by()
+        .annotate(period=TruncMonth("date"))
+        .values("license_plate", "period")
+        .annotate(amount=Sum("amount"))
+    )
+    for expense in expenses:
+        get_row(expense["license_plate"], expense["period"]).expenses += float(expense["amount"])
+
+    for row in rows.values():
+        row.revenue = round(row.revenue, 2)
+        row.expenses = round(row.expenses, 2)
+    return [rows[key] for key in sorted(rows)]
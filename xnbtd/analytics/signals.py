@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from xnbtd.analytics.models import Tariff, TariffTier
+from xnbtd.analytics.pricing import CARRIERS, get_carrier, invalidate_month
+from xnbtd.analytics.tariffs import invalidate_tariffs
+from xnbtd.tours.models import GLS, SHDEntry
+
+
+def invalidate_dates(carrier, *dates):
+    for month in {(d.year, d.month) for d in dates if d}:
+        invalidate_month(carrier, *month)
+
+
+def remember_tour_date(sender, instance, raw=False, **kwargs):
+    # A tour moved to another month changes both months: read the saved date
+    instance._pricing_date = None
+    if instance.pk and not instance._state.adding and not raw:
+        instance._pricing_date = (
+            sender.objects.filter(pk=instance.pk).values_list("date", flat=True).first()
+        )
+
+
+def invalidate_tour_pricing(sender, instance, **kwargs):
+    invalidate_dates(
+        get_carrier(sender).code, instance.date, getattr(instance, "_pricing_date", None)
+    )
+
+
+for carrier in CARRIERS.values():
+    pre_save.connect(remember_tour_date, sender=carrier.model)
+    post_save.connect(invalidate_tour_pricing, sender=carrier.model)
+    post_delete.connect(invalidate_tour_pricing, sender=carrier.model)
+
+
+@receiver(post_save, sender=SHDEntry)
+@receiver(post_delete, sender=SHDEntry)
+def invalidate_shd_pricing(sender, instance, **kwargs):
+    gls_date = GLS.objects.filter(pk=instance.gls_id).values_list("date", flat=True).first()
+    invalidate_dates("gls", gls_date)
+
+
+@receiver(post_save, sender=Tariff)
+@receiver(post_delete, sender=Tariff)
+@receiver(post_save, sender=TariffTier)
+@receiver(post_delete, sender=TariffTier)
+def invalidate_tariff_schedule(sender, **kwargs):
+    invalidate_tariffs()
@@ -0,0 +1,155 @@
+"""
+    Tariffs in force over time, compiled for the pricing engine.
+
+    The Tariff and TariffTier rows are loaded and compiled once per process into
+    a TariffSchedule per carrier. The schedules are kept until the tariffs change:
+    their version token in the cache is renewed by ``invalidate_tariffs()``. The
+    cache must be shared by the worker processes for the new token to reach all
+    of them (see ``CACHES`` in the settings). The token also expires after
+    ``TARIFFS_CACHE_TIMEOUT``, which bounds how long a process can price with
+    outdated tariffs when the cache is not shared.
+"""
+
+import uuid
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, FloatField, Q, Value, When
+
+
+TARIFFS_VERSION_KEY = "pricing:tariffs:version"
+
+_compiled = {"version": None, "schedules": {}}
+
+
+class CompiledTariff:
+    """
+    The tiers of a tariff, sorted by their first unit for each invoice line
+    """
+
+    def __init__(self, pk, carrier, name, valid_from, valid_until, tiers):
+        self.pk = pk
+        self.carrier = carrier
+        self.name = name
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        self.tiers = {}
+        for line, start, unit_price in tiers:
+            self.tiers.setdefault(line, []).append((start, float(unit_price)))
+        for line_tiers in self.tiers.values():
+            line_tiers.sort()
+
+    def covers(self, day):
+        return self.valid_from <= day and (self.valid_until is None or day <= self.valid_until)
+
+    def amount(self, line, quantity):
+        """
+        Price a quantity of units of an invoice line, each unit at the price of its tier
+        """
+        tiers = self.tiers.get(line, [])
+        amount = 0
+        for index, (start, unit_price) in enumerate(tiers):
+            end = tiers[index + 1][0] - 1 if index + 1 < len(tiers) else quantity
+            units = min(quantity, end) - start + 1
+            if units > 0:
+                amount += units * unit_price
+        return round(amount, 2)
+
+    def unit_price_cases(self, line, position):
+        """
+        Build the ``When`` clauses giving the unit price from the position of a unit
+
+        Args:
+            line: The invoice line
+            position: The name of the annotation holding the 1-based position of the unit
+
+        Returns:
+            list: ``When`` clauses, the last tiers first
+        """
+        return [
+            When(Q(**{f"{position}__gte": start}), then=Value(unit_price))
+            for start, unit_price in reversed(self.tiers.get(line, []))
+        ]
+
+
+class TariffSchedule:
+    """
+    The compiled tariffs sorted by start of validity, looked up by bisection
+    """
+
+    def __init__(self, tariffs):
+        self.tariffs = sorted(tariffs, key=lambda tariff: tariff.valid_from)
+        self._starts = [tariff.valid_from for tariff in self.tariffs]
+
+    def at(self, day):
+        """
+        Get the tariff in force on a day, or None
+        """
+        index = bisect_right(self._starts, day) - 1
+        if index < 0:
+            return None
+        tariff = self.tariffs[index]
+        return tariff if tariff.covers(day) else None
+
+    def unit_price(self, line, position, date_field):
+        """
+        Build an expression giving the unit price of a unit from its position and its date
+
+        Args:
+            line: The invoice line
+            position: The name of the annotation holding the 1-based position of the unit
+            date_field: The lookup path of the date deciding the tariff in force
+
+        Returns:
+            Expression: A float expression, 0 when no tariff is in force
+        """
+        cases = []
+        for tariff in self.tariffs:
+            validity = Q(**{f"{date_field}__gte": tariff.valid_from})
+            if tariff.valid_until:
+                validity &= Q(**{f"{date_field}__lte": tariff.valid_until})
+            for case in tariff.unit_price_cases(line, position):
+                cases.append(When(validity & case.condition, then=case.result))
+        return Case(*cases, default=Value(0.0), output_field=FloatField())
+
+
+def load_tariff_schedules():
+    from xnbtd.analytics.models import Tariff
+
+    tariffs = {}
+    for tariff in Tariff.objects.prefetch_related("tiers"):
+        tariffs.setdefault(tariff.carrier, []).append(
+            CompiledTariff(
+                tariff.pk,
+                tariff.carrier,
+                tariff.name,
+                tariff.valid_from,
+                tariff.valid_until,
+                [(tier.line, tier.start, tier.unit_price) for tier in tariff.tiers.all()],
+            )
+        )
+    return {carrier: TariffSchedule(compiled) for carrier, compiled in tariffs.items()}
+
+
+def get_tariffs_version():
+    version = cache.get(TARIFFS_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(TARIFFS_VERSION_KEY, version, settings.TARIFFS_CACHE_TIMEOUT)
+    return version
+
+
+def get_tariff_schedule(carrier):
+    """
+    Get the compiled tariffs of a carrier, loading them again only when they changed
+    """
+    version = get_tariffs_version()
+    if _compiled["version"] != version:
+        _compiled["schedules"] = load_tariff_schedules()
+        _compiled["version"] = version
+    return _compiled["schedules"].get(carrier) or TariffSchedule([])
+
+
+def invalidate_tariffs():
+    cache.set(TARIFFS_VERSION_KEY, uuid.uuid4().hex, settings.TARIFFS_CACHE_TIMEOUT)
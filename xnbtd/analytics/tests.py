@@ -1,14 +1,34 @@
 import csv
-from datetime import date
+import os
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
 from io import StringIO
+from unittest import mock
 
-from django.contrib.auth.models import User
-from django.test import TestCase
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
+from xnbtd.analytics import consolidated
 from xnbtd.analytics.export import export_as_csv
+from xnbtd.analytics.jobs import claim_pending_jobs, enqueue_export, run_export_job
+from xnbtd.analytics.pricing import (
+    compute_month_invoice,
+    compute_year_report,
+    get_month_invoice,
+)
+from xnbtd.analytics.reports import compute_profitability, shd_revenue
+from xnbtd.analytics.tariffs import TARIFFS_VERSION_KEY, get_tariff_schedule
+from xnbtd.tests_utils import create_ciblex, create_gls
+from xnbtd.tours.models import GLS, TOUR_MODELS, Ciblex, SHDEntry
 
-from .models import Expense
+from .models import Expense, ExportJob, Tariff, TariffTier
 
 
 class ExpenseModelTest(TestCase):
@@ -31,6 +51,11 @@ class ExpenseModelTest(TestCase):
         self.assertTrue('Test Expense' in str(self.expense))
         self.assertTrue('ABC123' in str(self.expense))
 
+    def test_date_plate_index(self):
+        """Test the expenses of a vehicle on a day are read with the composite index"""
+        plan = Expense.objects.filter(date=date(2024, 3, 4), license_plate='AB123CD').explain()
+        self.assertIn('analytics_exp_date_plate_idx', plan)
+
 
 class ExpenseAdminTest(TestCase):
     def setUp(self):
@@ -65,6 +90,42 @@ class ExpenseAdminTest(TestCase):
         self.assertContains(response, 'ABC123')
         self.assertContains(response, 'DEF456')
 
+    def test_expense_admin_statistics_follow_filters(self):
+        """Test the statistics sidebar is computed on the filtered changelist"""
+        url = reverse('admin:analytics_expense_changelist')
+        response = self.client.get(url, {'license_plate': 'DEF456'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Total des dépenses: 200.75')
+
+    def search(self, term):
+        url = reverse('admin:analytics_expense_changelist')
+        response = self.client.get(url, {'q': term}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [expense.title for expense in response.context['cl'].queryset]
+
+    def test_search_numbers_beyond_the_amount_digits(self):
+        """Test a number with more digits than the amounts matches none of them"""
+        self.assertEqual(self.search('123456789'), [])
+        self.assertEqual(self.search('12345678'), [])
+        self.assertEqual(self.search('12345678901.5'), [])
+        self.assertEqual(self.search('200.755'), [])
+        self.assertEqual(self.search('200,75'), ['Expense 2'])
+
+    def test_compute_statistics_single_query(self):
+        """Test every statistic of an admin is computed in one query"""
+        from xnbtd.statistics import compute_statistics
+
+        list_statistic = [
+            ('amount', 'Total'),
+            ('amount', 'Moyenne', 'avg'),
+            ('id', 'Nombre', 'count'),
+        ]
+        with self.assertNumQueries(1):
+            statistics = compute_statistics(Expense.objects.all(), list_statistic)
+        self.assertEqual(
+            [value for _, value in statistics], [Decimal('301.25'), Decimal('150.62'), 2]
+        )
+
     def test_expense_admin_add(self):
         """Test adding an expense through the admin"""
         url = reverse('admin:analytics_expense_add')
@@ -125,7 +186,7 @@ class ExportCSVTest(TestCase):
         self.assertTrue('attachment; filename=' in response['Content-Disposition'])
 
         # Parse the CSV content
-        content = response.content.decode('utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
         csv_reader = csv.reader(StringIO(content))
         rows = list(csv_reader)
 
@@ -137,8 +198,463 @@ class ExportCSVTest(TestCase):
         # Check that we have the correct number of data rows
         self.assertEqual(len(rows), 3)  # Header + 2 data rows
 
+    def test_export_column_plan(self):
+        """Test exports without display methods read tuples, and display methods lose their HTML"""
+        from django.contrib.admin.sites import AdminSite
+        from django.http import HttpRequest
+
+        from xnbtd.analytics.admin import ExpenseAdmin
+
+        request = HttpRequest()
+        request.user = self.admin_user
+        model_admin = ExpenseAdmin(Expense, AdminSite())
+        queryset = Expense.objects.order_by('date')
+
+        response = export_as_csv(
+            model_admin, request, queryset, fields=['title', 'amount', 'linked_user']
+        )
+        with mock.patch.object(Expense, '__init__', side_effect=AssertionError), \
+                self.assertNumQueries(1):
+            content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ['Intitulé', 'Montant', 'Utilisateur'])
+        self.assertEqual(rows[1][2], 'admin')
+
+        response = export_as_csv(model_admin, request, queryset, fields=['display_amount'])
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(rows[0], ['Montant'])
+        self.assertNotIn('<span', rows[1][0])
+        self.assertTrue(rows[1][0].endswith(' €'))
+
     def test_admin_export_action(self):
         """Test the export action in the admin"""
         # Skip this test for now as it's causing issues
         # We'll focus on fixing the basic functionality first
         pass
+
+
+class ExportJobTest(TestCase):
+    def setUp(self):
+        self.export_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_root)
+        settings_override = override_settings(EXPORT_JOB_THRESHOLD=1, EXPORT_ROOT=self.export_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+        self.expenses = [
+            Expense.objects.create(
+                title=f'Expense {number}',
+                license_plate='abc123',
+                amount=100,
+                date=date(2023, 1, number),
+                linked_user=self.admin_user,
+            )
+            for number in range(1, 4)
+        ]
+
+    def run_job(self):
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        job = enqueue_export(request, Expense.objects.all(), ['title'], 'expenses')
+        claim_pending_jobs(1)
+        run_export_job(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_large_exports_are_written_in_the_background(self):
+        """Test a large selection is enqueued, written by the worker and downloaded"""
+        response = self.client.post(
+            reverse('admin:analytics_expense_changelist'),
+            {
+                'action': 'export_route_as_csv',
+                '_selected_action': [expense.pk for expense in self.expenses],
+            },
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 302)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, ExportJob.PENDING)
+        self.assertEqual(job.total_rows, 3)
+
+        call_command('run_export_jobs', workers=0, once=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.DONE, job.error)
+        self.assertEqual((job.rows_written, job.progress), (3, 100))
+
+        url = reverse('admin:analytics_exportjob_download', args=[job.pk])
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertIn('Intitulé', rows[0])
+        # The rows keep the order of the changelist, newest first
+        title = rows[0].index('Intitulé')
+        self.assertEqual([row[title] for row in rows[1:]], ['Expense 3', 'Expense 2', 'Expense 1'])
+
+    def test_whole_changelist_is_read_by_the_worker(self):
+        """Test an export of every row keeps the changelist filters instead of the rows"""
+        Expense.objects.create(
+            title='Other', license_plate='xyz999', amount=10, date=date(2023, 1, 5)
+        )
+        url = reverse('admin:analytics_expense_changelist')
+        response = self.client.post(
+            f'{url}?license_plate__exact=ABC123',
+            {
+                'action': 'export_route_as_csv',
+                'select_across': '1',
+                '_selected_action': [self.expenses[0].pk],
+            },
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 302)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.object_ids, [])
+        self.assertEqual(job.filters, {'license_plate__exact': ['ABC123']})
+        self.assertEqual(job.total_rows, 3)
+
+        claim_pending_jobs(1)
+        run_export_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written), (ExportJob.DONE, 3))
+        with job.file.open('r') as file:
+            rows = list(csv.reader(file))
+        title = rows[0].index('Intitulé')
+        self.assertEqual([row[title] for row in rows[1:]], ['Expense 3', 'Expense 2', 'Expense 1'])
+
+    def test_exports_are_private(self):
+        """Test a user can neither see nor download the export of another user"""
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        job = enqueue_export(request, Expense.objects.all(), ['title'], 'expenses')
+        claim_pending_jobs(1)
+        run_export_job(job.pk)
+
+        User.objects.create_user(username='driver', password='driverpassword', is_staff=True)
+        self.client.login(username='driver', password='driverpassword')
+        url = reverse('admin:analytics_exportjob_download', args=[job.pk])
+        self.assertEqual(self.client.get(url, secure=True).status_code, 404)
+        response = self.client.get(reverse('admin:analytics_exportjob_changelist'), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'expenses')
+
+    def test_files_are_not_public(self):
+        """Test the files are written out of MEDIA_ROOT under a random name"""
+        job = self.run_job()
+        path = job.file.path
+        self.assertTrue(path.startswith(self.export_root))
+        self.assertTrue(os.path.exists(path))
+        self.assertRegex(os.path.basename(path), r'^[0-9a-f]{32}\.csv$')
+        with self.assertRaises(ValueError):
+            job.file.url
+
+    def test_interrupted_and_expired_jobs_are_cleaned(self):
+        """Test the command fails the jobs of dead workers and deletes the old exports"""
+        old = timezone.now() - timedelta(days=30)
+        done = self.run_job()
+        ExportJob.objects.filter(pk=done.pk).update(finished_at=old)
+        recent = self.run_job()
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        interrupted = enqueue_export(request, Expense.objects.all(), ['title'], 'expenses')
+        ExportJob.objects.filter(pk=interrupted.pk).update(
+            status=ExportJob.RUNNING, started_at=old
+        )
+
+        call_command('run_export_jobs', workers=0, once=True, stdout=StringIO())
+        self.assertFalse(ExportJob.objects.filter(pk=done.pk).exists())
+        self.assertFalse(os.path.exists(done.file.path))
+        self.assertTrue(os.path.exists(recent.file.path))
+        interrupted.refresh_from_db()
+        self.assertEqual(interrupted.status, ExportJob.FAILED)
+
+
+class ConsolidatedExportTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.driver = User.objects.create_user(
+            username='driver', password='driverpassword', is_staff=True
+        )
+        create_gls(self.admin_user, date=date(2024, 5, 3), packages_delivered=120, full_km=80)
+        create_gls(self.driver, date=date(2024, 5, 1), ending_hour=time(15, 30))
+        create_ciblex(
+            self.admin_user, beginning_hour=time(22, 0), ending_hour=time(6, 0), nights=1, days=3
+        )
+        # Outside of the period
+        create_gls(self.admin_user, date=date(2024, 6, 1))
+
+    def read_rows(self, content):
+        return list(csv.reader(StringIO(content)))
+
+    def test_tours_of_every_carrier_in_one_query(self):
+        """Test the tours of the carriers are read in a single query, in date order"""
+        with self.assertNumQueries(1):
+            lines = consolidated.stream_consolidated_csv(date(2024, 5, 1), date(2024, 5, 31))
+            content = ''.join(lines)
+        rows = self.read_rows(content)
+        self.assertEqual(rows[0][:3], ['Transporteur', 'Date', 'Numéro de tournée'])
+        self.assertEqual([row[1] for row in rows[1:]], ['2024-05-01', '2024-05-02', '2024-05-03'])
+        driver_gls, ciblex, admin_gls = rows[1:]
+        self.assertEqual(driver_gls[0], 'GLS')
+        self.assertEqual(driver_gls[3], 'driver')
+        self.assertEqual(driver_gls[7], '510')
+        # Normalized counters: points, packages, pickups, days, kilometers
+        self.assertEqual(ciblex[7:], ['480', '', '', '', '3', ''])
+        self.assertEqual(admin_gls[8:], ['0', '120', '0', '', '80'])
+
+    def test_view_and_command(self):
+        """Test the view only gives a driver their own tours, and the command"""
+        url = reverse('analytics:consolidated_export')
+        period = {'start': '2024-05-01', 'end': '2024-05-31'}
+        self.assertEqual(self.client.get(url, period, secure=True).status_code, 302)
+        self.client.login(username='driver', password='driverpassword')
+        # The tours of every carrier must be visible to the driver
+        self.assertEqual(self.client.get(url, period, secure=True).status_code, 403)
+        for model in TOUR_MODELS:
+            self.driver.user_permissions.add(
+                Permission.objects.get(
+                    content_type=ContentType.objects.get_for_model(model),
+                    codename=f'view_{model._meta.model_name}',
+                )
+            )
+
+        response = self.client.get(url, period, secure=True)
+        self.assertEqual(response.status_code, 200)
+        rows = self.read_rows(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual([row[3] for row in rows[1:]], ['driver'])
+
+        # The export is linked from the tours changelists
+        changelist = self.client.get(reverse('admin:tours_gls_changelist'), secure=True)
+        self.assertContains(changelist, url)
+
+        stdout = StringIO()
+        call_command('export_tours', '2024-05-01', '2024-06-30', stdout=stdout)
+        self.assertEqual(len(self.read_rows(stdout.getvalue())), 5)
+
+
+class PricingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # The tariffs are compiled once, before the pricing queries are counted
+        get_tariff_schedule('gls')
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+        create_gls(self.admin_user, packages_delivered=18000, pickup_point=100, eo=10)
+        create_gls(self.admin_user, packages_delivered=1000, pickup_point=50, eo=4)
+        # Outside of the invoiced month
+        create_gls(self.admin_user, date=date(2024, 6, 1), packages_delivered=500)
+
+    def test_month_invoice(self):
+        """Test the GLS month invoice is computed in a query, and one more for the SHD"""
+        with self.assertNumQueries(2):
+            invoice = compute_month_invoice(GLS.objects.all(), 2024, 5)
+        self.assertEqual(invoice.tours, 2)
+        self.assertEqual(invoice['delivered'].quantity, 19000)
+        self.assertEqual(invoice['delivered'].amount, round(18671 * 3.17 + 329 * 2.82, 2))
+        self.assertEqual(invoice['regular_pickup'].amount, 228.0)
+        self.assertEqual(invoice['eo'].amount, 21.0)
+        self.assertEqual(invoice.total, round(invoice['delivered'].amount + 228.0 + 21.0, 2))
+
+    def test_month_invoice_in_changelist(self):
+        """Test the GLS changelist shows the invoice of the selected month"""
+        url = reverse('admin:tours_gls_changelist')
+        response = self.client.get(url, {'date__year': 2024, 'date__month': 5}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Pricing GLS')
+        self.assertContains(response, 'Enlèvements occasionnels (EO): 21.0 €')
+
+    def test_shd_line_matches_tiers(self):
+        """Test the SHD entries are priced by rank within each tour on the GLS invoice"""
+        values_per_tour = [[5, 3, 2, 7], [4], [1, 6]]
+        expected = 0
+        for values in values_per_tour:
+            gls = create_gls(self.admin_user, date=date(2024, 5, 20))
+            for position, value in enumerate(values):
+                SHDEntry.objects.create(gls=gls, value=value)
+                expected += value * (3.17 if position == 0 else 0.63 if position == 1 else 0.32)
+
+        with self.assertNumQueries(2):
+            invoice = compute_month_invoice(GLS.objects.filter(date=date(2024, 5, 20)), 2024, 5)
+        self.assertEqual(invoice['shd'].quantity, sum(map(sum, values_per_tour)))
+        self.assertEqual(invoice['shd'].amount, round(expected, 2))
+        self.assertEqual(invoice.total, round(expected, 2))
+
+        report = compute_year_report(GLS.objects.all(), 2024)
+        self.assertEqual(report.months[4]['shd'], invoice['shd'])
+
+    def test_month_invoice_cache(self):
+        """Test cached invoices are only invalidated for the month of a changed tour"""
+        may = get_month_invoice(GLS.objects.all(), 2024, 5)
+        get_month_invoice(GLS.objects.all(), 2024, 6)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_month_invoice(GLS.objects.all(), 2024, 5), may)
+            get_month_invoice(GLS.objects.all(), 2024, 6)
+
+        create_gls(self.admin_user, packages_delivered=10)
+        with self.assertNumQueries(0):
+            get_month_invoice(GLS.objects.all(), 2024, 6)
+        with self.assertNumQueries(2):
+            invoice = get_month_invoice(GLS.objects.all(), 2024, 5)
+        self.assertEqual(invoice['delivered'].quantity, 19010)
+
+        # Another filter scope is cached separately
+        scoped = get_month_invoice(GLS.objects.filter(packages_delivered=10), 2024, 5)
+        self.assertEqual(scoped['delivered'].quantity, 10)
+
+    def test_moved_tour_invalidates_both_months(self):
+        """Test moving a tour to another month drops the cached invoices of both months"""
+        tour = create_gls(self.admin_user, packages_delivered=10)
+        may = get_month_invoice(GLS.objects.all(), 2024, 5)
+        get_month_invoice(GLS.objects.all(), 2024, 6)
+
+        tour = GLS.objects.get(pk=tour.pk)
+        tour.date = date(2024, 6, 3)
+        tour.save()
+        with self.assertNumQueries(4):
+            self.assertEqual(
+                get_month_invoice(GLS.objects.all(), 2024, 5)['delivered'].quantity,
+                may['delivered'].quantity - 10,
+            )
+            get_month_invoice(GLS.objects.all(), 2024, 6)
+
+    def test_year_report(self):
+        """Test the yearly report applies the tiers per month in one query, and one for the SHD"""
+        create_gls(self.admin_user, date=date(2024, 6, 3), packages_delivered=18000)
+        with self.assertNumQueries(2):
+            report = compute_year_report(GLS.objects.all(), 2024)
+        self.assertEqual(len(report.months), 12)
+        self.assertEqual(report.months[4], compute_month_invoice(GLS.objects.all(), 2024, 5))
+        # June stays below the threshold on its own
+        self.assertEqual(report.months[5]['delivered'].amount, round(18500 * 3.17, 2))
+        self.assertEqual(report.months[0].total, 0)
+        self.assertEqual(report.tours, 4)
+        self.assertEqual(report.total, round(sum(invoice.total for invoice in report.months), 2))
+
+    def test_year_report_in_changelist(self):
+        """Test the GLS changelist shows the yearly report when only the year is selected"""
+        url = reverse('admin:tours_gls_changelist')
+        response = self.client.get(url, {'date__year': 2024}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Pricing GLS (2024)')
+        self.assertContains(response, '06/2024')
+
+    def test_compiled_tariffs_expire(self):
+        """Test a process loads the tariffs again once their version token expired"""
+        self.assertEqual(get_tariff_schedule('gls').at(date(2024, 5, 1)).name, 'GLS')
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            get_tariff_schedule('gls')
+            cache.delete(TARIFFS_VERSION_KEY)
+            get_tariff_schedule('gls')
+        self.assertEqual(cache_set.call_args.args[2], 5 * 60)
+
+        # A change made by another process, whose invalidation was not seen here
+        Tariff.objects.filter(name='GLS').update(name='GLS 2')
+        self.assertEqual(get_tariff_schedule('gls').at(date(2024, 5, 1)).name, 'GLS')
+        cache.delete(TARIFFS_VERSION_KEY)
+        self.assertEqual(get_tariff_schedule('gls').at(date(2024, 5, 1)).name, 'GLS 2')
+
+    def test_admin_checks_the_tiers_of_a_new_tariff(self):
+        """Test the tiers created with their tariff are checked against its carrier"""
+        Tariff.objects.filter(carrier='ciblex').delete()
+        url = reverse('admin:analytics_tariff_add')
+        data = {
+            'carrier': 'ciblex',
+            'name': 'Ciblex 2030',
+            'valid_from': '2030-01-01',
+            'tiers-TOTAL_FORMS': 1,
+            'tiers-INITIAL_FORMS': 0,
+            'tiers-0-line': 'delivered',
+            'tiers-0-start': 1,
+            'tiers-0-unit_price': '150',
+        }
+        response = self.client.post(url, data, secure=True)
+        self.assertContains(response, 'Cette ligne ne concerne pas le transporteur du tarif.')
+
+        # Units are counted from 1, a tier from 0 would price one unit too many
+        data.update({'tiers-0-line': 'days', 'tiers-0-start': 0})
+        response = self.client.post(url, data, secure=True)
+        self.assertContains(response, 'greater than or equal to 1')
+        self.assertFalse(Tariff.objects.filter(carrier='ciblex').exists())
+
+        data['tiers-0-start'] = 1
+        response = self.client.post(url, data, secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(TariffTier.objects.filter(tariff__carrier='ciblex').values_list('line', 'start')),
+            [('days', 1)],
+        )
+
+    def test_months_are_priced_with_the_tariff_in_force(self):
+        """Test each month is priced with the tariff in force on its first day"""
+        Tariff.objects.filter(name='GLS').update(valid_until=date(2024, 5, 31))
+        tariff = Tariff.objects.create(name='GLS 2024', valid_from=date(2024, 6, 1))
+        TariffTier.objects.create(tariff=tariff, line='delivered', start=1, unit_price=4)
+
+        report = compute_year_report(GLS.objects.all(), 2024)
+        self.assertEqual(report.months[4].tariff, 'GLS')
+        self.assertEqual(report.months[4]['eo'].amount, 21.0)
+        self.assertEqual(report.months[5].tariff, 'GLS 2024')
+        self.assertEqual(report.months[5]['delivered'].amount, 2000.0)
+        self.assertEqual(report.months[5]['eo'].amount, 0)
+
+    def test_other_carriers_are_priced_with_their_tariff(self):
+        """Test a carrier other than GLS is invoiced through the same engine"""
+        tariff = Tariff.objects.create(carrier='ciblex', name='Ciblex', valid_from=date(2024, 1, 1))
+        TariffTier.objects.create(tariff=tariff, line='days', start=1, unit_price=150)
+        for days in (1, 2):
+            create_ciblex(self.admin_user, date=date(2024, 5, 6), days=days)
+
+        get_tariff_schedule('ciblex')
+        with self.assertNumQueries(1):
+            invoice = compute_month_invoice(Ciblex.objects.all(), 2024, 5)
+        self.assertEqual(invoice.tariff, 'Ciblex')
+        self.assertEqual(invoice['days'].quantity, 3)
+        self.assertEqual(invoice.total, 450.0)
+
+        url = reverse('admin:tours_ciblex_changelist')
+        response = self.client.get(url, {'date__year': 2024, 'date__month': 5}, secure=True)
+        self.assertContains(response, 'Pricing Ciblex (5/2024)')
+        self.assertContains(response, 'Jours: 450.0 €')
+
+    def test_profitability_per_vehicle(self):
+        """Test revenue and expenses are merged per plate and month in grouped queries"""
+        gls = create_gls(self.admin_user, license_plate='zz999zz', eo=6)
+        SHDEntry.objects.create(gls=gls, value=2)
+        SHDEntry.objects.create(gls=gls, value=1)
+        Expense.objects.create(
+            title='Gazole', license_plate='zz999zz', amount=80, date=date(2024, 5, 3)
+        )
+        get_tariff_schedule('gls')
+
+        # The tiers are monthly, so the period is read by whole months
+        with self.assertNumQueries(7):
+            rows = compute_profitability(date(2024, 5, 10), date(2024, 5, 20))
+        self.assertEqual(
+            [(row.license_plate, row.tours) for row in rows], [('AB123CD', 2), ('ZZ999ZZ', 1)]
+        )
+        # The SHD line of the GLS invoice is priced like the revenue of the vehicles
+        invoice = compute_month_invoice(GLS.objects.all(), 2024, 5)
+        self.assertEqual(invoice['shd'].amount, 6.97)
+        self.assertAlmostEqual(sum(row.revenue for row in rows), invoice.total, places=1)
+        self.assertEqual(rows[1].revenue, 15.97)
+        self.assertEqual(rows[1].expenses, 80.0)
+        self.assertEqual(rows[1].margin, -64.03)
+
+        # The SHD entries are summed in the database, one row per plate and month
+        shd = shd_revenue(date(2024, 5, 1), date(2024, 5, 31))
+        self.assertEqual(
+            [(plate.upper(), month, round(amount, 2)) for plate, month, amount in shd],
+            [('ZZ999ZZ', date(2024, 5, 1), 6.97)],
+        )
+
+        url = reverse('admin:analytics_expense_profitability')
+        response = self.client.get(url, {'start': '2024-05-01', 'end': '2024-05-31'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'ZZ999ZZ')
@@ -1,9 +1,10 @@
-# from django.urls import path
-# from . import views
+from django.urls import path
+
+from . import views
 
 
 app_name = 'analytics'
 
 urlpatterns = [
-    # Add any custom views here if needed
+    path('tours/', views.consolidated_export, name='consolidated_export'),
 ]
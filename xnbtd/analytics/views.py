@@ -1,4 +1,61 @@
-# from django.shortcuts import render
+"""
+    Views reading the tours of every carrier, outside of the admin of a single model.
+"""
 
+from datetime import date
 
-# Create your views here.
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth import get_permission_codename
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.views.decorators.cache import never_cache
+
+from xnbtd.analytics.consolidated import stream_consolidated_csv
+from xnbtd.tours.models import TOUR_MODELS
+
+
+def get_period(request, default_start, default_end):
+    """
+    Read the ``start`` and ``end`` ISO dates of a period from the query string
+    """
+    try:
+        start = date.fromisoformat(request.GET.get("start", ""))
+    except ValueError:
+        start = default_start
+    try:
+        end = date.fromisoformat(request.GET.get("end", ""))
+    except ValueError:
+        end = default_end
+    return start, end
+
+
+def has_tours_permission(user):
+    """
+    Whether a user may view the tours of every carrier, as the tours admins check it
+    """
+    for model in TOUR_MODELS:
+        opts = model._meta
+        if not any(
+            user.has_perm(f"{opts.app_label}.{get_permission_codename(action, opts)}")
+            for action in ("view", "change")
+        ):
+            return False
+    return True
+
+
+@never_cache
+@staff_member_required
+def consolidated_export(request):
+    """CSV of the tours of every carrier over a period, a driver only getting their own"""
+    if not has_tours_permission(request.user):
+        raise PermissionDenied
+
+    today = date.today()
+    start, end = get_period(request, today.replace(day=1), today)
+    user = None if request.user.is_superuser else request.user
+    response = StreamingHttpResponse(
+        stream_consolidated_csv(start, end, user), content_type="text/csv"
+    )
+    filename = f"tournees_{start:%Y%m%d}_{end:%Y%m%d}.csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,159 @@
+"""
+    Optional full-text indexes over the free text columns.
+
+    * With SQLite, each indexed table gets an FTS5 external content table named
+      ``<table>_fts``, kept in sync with the table by triggers.
+    * With PostgreSQL, each indexed column gets a GIN index on its ``tsvector``.
+
+    The indexes are created by migrations when the database supports them. The
+    SQLite triggers are not part of the schema known to Django: a later migration
+    rebuilding the table drops them silently, so it must call
+    ``create_fulltext_index()`` again. The admin search uses ``fulltext_match()``
+    for these columns and falls back to ``icontains`` when no index is available,
+    or when the triggers keeping it in sync are missing. Words are matched on their
+    prefix, so ``absen`` finds ``Client absent``.
+"""
+
+import re
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+# Text search configuration of the PostgreSQL indexes, without language stemming
+POSTGRESQL_CONFIG = "simple"
+
+WORD_RE = re.compile(r"\w+")
+
+_available = {}
+
+
+def fts_table(db_table):
+    return f"{db_table}_fts"
+
+
+def tsvector_sql(column):
+    return f"to_tsvector('{POSTGRESQL_CONFIG}', coalesce(\"{column}\", ''))"
+
+
+def sqlite_fulltext_sql(db_table, column):
+    fts = fts_table(db_table)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} "
+        f"USING fts5({column}, content='{db_table}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {db_table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {db_table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column} ON {db_table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def create_fulltext_index(schema_editor, db_table, column):
+    """
+    Create the full-text index of a column, when the database supports it
+
+    The index is created again if it exists: SQLite drops the triggers when a
+    migration rebuilds the table, so this is also run after such migrations.
+
+    Args:
+        schema_editor: The schema editor of the migration
+        db_table: The name of the indexed table
+        column: The name of the indexed text column
+
+    Returns:
+        bool: True if the index exists
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                for sql in sqlite_fulltext_sql(db_table, column):
+                    schema_editor.execute(sql)
+        except DatabaseError:
+            # SQLite built without the FTS5 extension
+            return False
+        return True
+    if vendor == "postgresql":
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{db_table}_{column}_fts_idx" '
+            f"ON \"{db_table}\" USING GIN ({tsvector_sql(column)})"
+        )
+        return True
+    return False
+
+
+def drop_fulltext_index(schema_editor, db_table, column):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        fts = fts_table(db_table)
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{db_table}_{column}_fts_idx"')
+
+
+def sqlite_fulltext_available(db_table):
+    """
+    Tell if the FTS5 table of a table exists with the three triggers keeping it in sync
+    """
+    fts = fts_table(db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master "
+            "WHERE (type = 'table' AND name = %s) OR (type = 'trigger' AND tbl_name = %s)",
+            [fts, db_table],
+        )
+        objects = set(cursor.fetchall())
+    expected = {("table", fts)} | {
+        ("trigger", f"{fts}_{trigger}") for trigger in ("insert", "delete", "update")
+    }
+    return expected <= objects
+
+
+def fulltext_available(model):
+    """
+    Tell if the table of a model has a usable full-text index, checked once per process
+    """
+    db_table = model._meta.db_table
+    if db_table not in _available:
+        if connection.vendor == "sqlite":
+            _available[db_table] = sqlite_fulltext_available(db_table)
+        else:
+            _available[db_table] = connection.vendor == "postgresql"
+    return _available[db_table]
+
+
+def fulltext_match(model, column, term):
+    """
+    Build the filter matching the rows whose column contains every word of a term
+
+    Args:
+        model: The model of the indexed table
+        column: The name of the indexed text column
+        term: The searched text
+
+    Returns:
+        Q: The filter, or None if the column has no full-text index or the term no word
+    """
+    words = WORD_RE.findall(term)
+    if not words or not fulltext_available(model):
+        return None
+
+    db_table = model._meta.db_table
+    if connection.vendor == "sqlite":
+        fts = fts_table(db_table)
+        sql = f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s"
+        query = " ".join(f'"{word}"*' for word in words)
+    else:
+        sql = (
+            f'SELECT "id" FROM "{db_table}" '
+            f"WHERE {tsvector_sql(column)} @@ to_tsquery('{POSTGRESQL_CONFIG}', %s)"
+        )
+        query = " & ".join(f"{word}:*" for word in words)
+    return Q(pk__in=RawSQL(sql, [query]))
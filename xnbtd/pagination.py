@@ -0,0 +1,163 @@
+"""
+    Keyset pagination for the changelists of large tables.
+
+    Django paginates a changelist with OFFSET and counts its rows on every page,
+    both getting slower as the table grows. ``KeysetChangeList`` instead seeks on
+    ``(date, id)``: the next page holds the rows older than the last row shown,
+    using the index on these columns, so a deep page costs as much as the first.
+    The row counts are cached for ``CHANGELIST_COUNT_CACHE_TIMEOUT`` seconds, and
+    the count of a whole table is estimated from the statistics of PostgreSQL.
+
+    Keyset pagination only applies to the default ordering, newest first. A
+    changelist sorted on a column is paginated by Django as usual.
+"""
+
+import hashlib
+from datetime import date
+
+from django.conf import settings
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import BigIntegerField, Q
+
+
+AFTER_VAR = "after"
+BEFORE_VAR = "before"
+CURSOR_VARS = (AFTER_VAR, BEFORE_VAR)
+
+
+def make_cursor(obj):
+    return f"{obj.date.isoformat()}.{obj.pk}"
+
+
+def parse_cursor(cursor):
+    """
+    Get the ``(date, id)`` position of a cursor, or None if it is not valid
+
+    An id out of the range of the primary keys is not valid: the database could
+    not compare it.
+    """
+    try:
+        day, pk = cursor.split(".")
+        day, pk = date.fromisoformat(day), int(pk)
+    except (AttributeError, ValueError):
+        return None
+    if not 0 < pk <= BigIntegerField.MAX_BIGINT:
+        return None
+    return day, pk
+
+
+def estimate_table_count(model):
+    """
+    Get the number of rows of a table from the PostgreSQL statistics, or None
+    """
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 (or 0) until the table is analyzed
+    return int(row[0]) if row and row[0] > 0 else None
+
+
+def cached_count(queryset):
+    """
+    Count the rows of a queryset, keeping the count in the cache for a while
+
+    Returns:
+        tuple: ``(count, estimated)``
+    """
+    if not queryset.query.has_filters():
+        estimate = estimate_table_count(queryset.model)
+        if estimate is not None:
+            return estimate, True
+
+    try:
+        sql = str(queryset.order_by().query)
+    except EmptyResultSet:
+        return 0, False
+    key = f"changelist:count:{hashlib.md5(sql.encode()).hexdigest()}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.CHANGELIST_COUNT_CACHE_TIMEOUT)
+    return count, False
+
+
+class KeysetChangeList(ChangeList):
+    """
+    ChangeList paginated with ``after`` and ``before`` cursors on ``(date, id)``
+    """
+
+    keyset_ordering = ["-date", "-pk"]
+
+    def is_keyset(self):
+        return ORDER_VAR not in self.params and not self.list_editable
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for name in CURSOR_VARS:
+            lookup_params.pop(name, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, sort and search links start over from the first page
+        new_params = new_params or {}
+        remove = [*(remove or []), *(name for name in CURSOR_VARS if name not in new_params)]
+        return super().get_query_string(new_params, remove)
+
+    def get_ordering(self, request, queryset):
+        if self.is_keyset():
+            return self.keyset_ordering
+        return super().get_ordering(request, queryset)
+
+    def get_results(self, request):
+        self.keyset = self.is_keyset()
+        if not self.keyset:
+            return super().get_results(request)
+
+        after = parse_cursor(request.GET.get(AFTER_VAR))
+        before = None if after else parse_cursor(request.GET.get(BEFORE_VAR))
+        queryset = self.queryset
+        if after:
+            day, pk = after
+            queryset = queryset.filter(Q(date__lt=day) | Q(date=day, pk__lt=pk))
+        elif before:
+            day, pk = before
+            queryset = queryset.filter(Q(date__gt=day) | Q(date=day, pk__gt=pk)).order_by(
+                "date", "pk"
+            )
+
+        # One more row tells if there is a page beyond this one
+        result_list = list(queryset[: self.list_per_page + 1])
+        has_more = len(result_list) > self.list_per_page
+        result_list = result_list[: self.list_per_page]
+        if before:
+            result_list.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = after is not None, has_more
+
+        self.result_count, self.result_count_estimated = cached_count(self.queryset)
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        if self.show_full_result_count:
+            self.full_result_count, _ = cached_count(self.root_queryset)
+        else:
+            self.full_result_count = None
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = has_previous or has_next
+        self.paginator = None
+
+        self.first_url = self.get_query_string() if has_previous else None
+        self.previous_url = None
+        self.next_url = None
+        if has_previous and result_list:
+            self.previous_url = self.get_query_string({BEFORE_VAR: make_cursor(result_list[0])})
+        if has_next and result_list:
+            self.next_url = self.get_query_string({AFTER_VAR: make_cursor(result_list[-1])})
@@ -1,8 +1,17 @@
+from datetime import date
+
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from xnbtd.analytics.views import get_period
+from xnbtd.tours.models import TOUR_MODELS
+
+from .conflicts import find_rest_conflicts
 from .forms import RestAdminForm
 from .models import Event, Rest
 
@@ -27,6 +36,18 @@ class StatusFilter(admin.SimpleListFilter):
             return queryset.filter(status=False)
 
 
+class OverlapFilter(admin.SimpleListFilter):
+    title = _('overlap')
+    parameter_name = 'overlap'
+
+    def lookups(self, request, model_admin):
+        return [('yes', _('overlapping another rest'))]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.conflicts()
+
+
 # Admins
 class EventAdmin(admin.ModelAdmin):
     list_filter = ("date",)
@@ -39,8 +60,9 @@ class EventAdmin(admin.ModelAdmin):
 
 class RestAdmin(admin.ModelAdmin):
     form = RestAdminForm
+    change_list_template = "xnbtd/admin/rest_change_list.html"
     list_display = ("display_status", "linked_user", "start_date", "end_date")
-    list_filter = (StatusFilter, "linked_user")
+    list_filter = (StatusFilter, OverlapFilter, "linked_user")
 
     def display_status(self, obj):
         if obj.status:
@@ -73,6 +95,47 @@ class RestAdmin(admin.ModelAdmin):
             return super().formfield_for_foreignkey(db_field, request, **kwargs)
         return super(RestAdmin, self).formfield_for_foreignkey(db_field, request, **kwargs)
 
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context["tour_conflicts_url"] = reverse("admin:plannings_rest_tour_conflicts")
+        return super(RestAdmin, self).changelist_view(request, extra_context=extra_context)
+
+    def get_urls(self):
+        return [
+            path(
+                "tour-conflicts/",
+                self.admin_site.admin_view(self.tour_conflicts_view),
+                name="plannings_rest_tour_conflicts",
+            ),
+        ] + super(RestAdmin, self).get_urls()
+
+    def tour_conflicts_view(self, request):
+        """Tours logged during a validated rest of their driver"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        today = date.today()
+        start, end = get_period(request, date(today.year, 1, 1), today)
+        user = None if request.user.is_superuser else request.user
+        # Only link the tours the user may open
+        viewable = {
+            model
+            for model in TOUR_MODELS
+            if self.admin_site._registry[model].has_view_permission(request)
+        }
+        context = {
+            **self.admin_site.each_context(request),
+            "title": _("Tours during a rest"),
+            "opts": self.model._meta,
+            "start": start,
+            "end": end,
+            "conflicts": [
+                (conflict, conflict.tour_url if conflict.model in viewable else None)
+                for conflict in find_rest_conflicts(start, end, user)
+            ],
+        }
+        return TemplateResponse(request, "xnbtd/admin/rest_conflicts.html", context)
+
 
 admin.site.register(Event, EventAdmin)
 admin.site.register(Rest, RestAdmin)
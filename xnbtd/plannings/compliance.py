@@ -0,0 +1,133 @@
+"""
+    Working time compliance of the drivers.
+
+    A driver may log tours of several carriers on the same day, so the worked
+    time of a day is summed over the five tour tables. Each table is read with a
+    single query grouped by driver and day on the stored ``worked_minutes`` and
+    ``break_minutes`` columns, whatever the number of drivers, and the days are
+    then summed by week. The limits are read from the ``COMPLIANCE_*`` settings.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+
+from xnbtd.tours.models import TOUR_MODELS
+
+
+DAILY = "daily"
+WEEKLY = "weekly"
+BREAK = "break"
+
+BREACH_LABELS = {
+    DAILY: "Durée journalière dépassée",
+    WEEKLY: "Durée hebdomadaire dépassée",
+    BREAK: "Pause insuffisante",
+}
+
+
+@dataclass(frozen=True)
+class Limits:
+    max_daily_minutes: int
+    max_weekly_minutes: int
+    break_after_minutes: int
+    min_break_minutes: int
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_daily_minutes=settings.COMPLIANCE_MAX_DAILY_HOURS * 60,
+            max_weekly_minutes=settings.COMPLIANCE_MAX_WEEKLY_HOURS * 60,
+            break_after_minutes=settings.COMPLIANCE_BREAK_AFTER_HOURS * 60,
+            min_break_minutes=settings.COMPLIANCE_MIN_BREAK_MINUTES,
+        )
+
+
+@dataclass(frozen=True)
+class Breach:
+    username: str
+    kind: str
+    # The day, or the Monday of the week
+    start: date
+    minutes: int
+    limit: int
+
+    @property
+    def label(self):
+        return BREACH_LABELS[self.kind]
+
+
+def daily_times(start, end, user=None):
+    """
+    Sum the worked and break minutes of each driver and day over every carrier
+
+    A tour is counted whole on its ``date``: the minutes of a night tour ending
+    after midnight are not split, they all go to the day the tour starts. This
+    keeps a single grouped query per table on the stored durations, at the cost
+    of the daily limits being checked per tour start day rather than per
+    calendar day.
+
+    Args:
+        start: The first day of the period
+        end: The last day of the period
+        user: Only read the tours of this driver, when given
+
+    Returns:
+        dict: ``(username, day)`` -> ``[worked minutes, break minutes]``
+    """
+    days = {}
+    for model in TOUR_MODELS:
+        queryset = model.objects.filter(date__gte=start, date__lte=end)
+        if user is not None:
+            queryset = queryset.filter(linked_user=user)
+        rows = (
+            queryset.order_by()
+            .values_list("linked_user__username", "date")
+            .annotate(worked=Sum("worked_minutes"), breaks=Sum("break_minutes"))
+        )
+        for username, day, worked, breaks in rows:
+            times = days.setdefault((username, day), [0, 0])
+            times[0] += worked
+            times[1] += breaks
+    return days
+
+
+def check_compliance(start, end, user=None, limits=None):
+    """
+    Find the breaches of the working time limits over a period
+
+    The weeks overlapping the period are read whole, so their total is right even
+    when the period starts or ends in the middle of a week.
+
+    Args:
+        start: The first day of the period
+        end: The last day of the period
+        user: Only check this driver, when given
+        limits: The Limits to check, read from the settings by default
+
+    Returns:
+        list: The Breaches, sorted by driver and day
+    """
+    limits = limits or Limits.from_settings()
+    first_monday = start - timedelta(days=start.weekday())
+    last_sunday = end + timedelta(days=6 - end.weekday())
+
+    breaches = []
+    weeks = {}
+    for (username, day), (worked, breaks) in daily_times(first_monday, last_sunday, user).items():
+        monday = day - timedelta(days=day.weekday())
+        weeks[(username, monday)] = weeks.get((username, monday), 0) + worked
+        if not start <= day <= end:
+            continue
+        if worked > limits.max_daily_minutes:
+            breaches.append(Breach(username, DAILY, day, worked, limits.max_daily_minutes))
+        if worked > limits.break_after_minutes and breaks < limits.min_break_minutes:
+            breaches.append(Breach(username, BREAK, day, breaks, limits.min_break_minutes))
+
+    for (username, monday), worked in weeks.items():
+        if worked > limits.max_weekly_minutes:
+            breaches.append(Breach(username, WEEKLY, monday, worked, limits.max_weekly_minutes))
+
+    return sorted(breaches, key=lambda breach: (breach.username, breach.start, breach.kind))
@@ -0,0 +1,114 @@
+"""
+    Tours logged during a validated rest of their driver.
+
+    The tours of the five carrier tables are read in one ``UNION ALL`` query,
+    each tour being kept when a validated rest of its driver covers its date. The
+    test is an ``EXISTS`` semi-join on the (linked_user, start_date, end_date)
+    index of the rests, which the database may stop at the first rest found,
+    rather than a scalar subquery run for every tour to fetch the rest. The rests
+    of the drivers found are then read with a second query and matched to the
+    tours in Python, so the report takes two queries whatever the length of the
+    period.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+
+from django.db.models import Exists, F, OuterRef, Value
+from django.urls import reverse
+
+from xnbtd.tours.models import TOUR_MODELS
+
+from .models import Rest
+
+
+@dataclass(frozen=True)
+class TourConflict:
+    model: type
+    tour_id: int
+    tour_date: date
+    tour_name: str
+    username: str
+    rest: Rest
+
+    @property
+    def carrier(self):
+        return self.model._meta.verbose_name
+
+    @property
+    def tour_url(self):
+        opts = self.model._meta
+        return reverse(f"admin:{opts.app_label}_{opts.model_name}_change", args=[self.tour_id])
+
+
+def carrier_conflicts(model, start=None, end=None, user=None):
+    """
+    Select the tours of a carrier logged during a validated rest of their driver
+    """
+    rests = Rest.objects.filter(
+        status=True,
+        linked_user=OuterRef("linked_user"),
+        start_date__lte=OuterRef("date"),
+        end_date__gte=OuterRef("date"),
+    )
+    queryset = model.objects.filter(Exists(rests))
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lte=end)
+    if user is not None:
+        queryset = queryset.filter(linked_user=user)
+
+    # Every column is an annotation, so the five SELECT lists match
+    columns = {
+        "carrier": Value(model._meta.model_name),
+        "tour_id": F("pk"),
+        "tour_date": F("date"),
+        "tour_name": F("name"),
+        "driver": F("linked_user__username"),
+        "user_id": F("linked_user_id"),
+    }
+    return queryset.order_by().annotate(**columns).values_list(*columns)
+
+
+def find_rest_conflicts(start=None, end=None, user=None):
+    """
+    Find the tours logged during a validated rest of their driver
+
+    Args:
+        start: The first day of the period, the first tour by default
+        end: The last day of the period, the last tour by default
+        user: Only read the tours of this driver, when given
+
+    Returns:
+        list: The TourConflicts, sorted by date and driver
+    """
+    models = {model._meta.model_name: model for model in TOUR_MODELS}
+    first, *others = [carrier_conflicts(model, start, end, user) for model in TOUR_MODELS]
+    rows = list(first.union(*others, all=True).order_by("tour_date", "driver", "carrier"))
+    if not rows:
+        return []
+
+    rests = {}
+    for rest in (
+        Rest.objects.filter(status=True, linked_user__in={row[-1] for row in rows})
+        .overlapping(rows[0][2], rows[-1][2])
+        .order_by("start_date")
+    ):
+        rests.setdefault(rest.linked_user_id, []).append(rest)
+
+    conflicts = []
+    for carrier, tour_id, tour_date, tour_name, driver, user_id in rows:
+        rest = next(
+            (
+                rest
+                for rest in rests.get(user_id, [])
+                if rest.start_date <= tour_date <= rest.end_date
+            ),
+            None,
+        )
+        if rest is None:
+            # The rest was changed or deleted since the tours were read
+            continue
+        conflicts.append(TourConflict(models[carrier], tour_id, tour_date, tour_name, driver, rest))
+    return conflicts
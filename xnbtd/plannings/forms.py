@@ -22,4 +22,20 @@ class RestAdminForm(forms.ModelForm):
             if 'status' in self.changed_data and not self.current_user.is_superuser:
                 raise ValidationError(_('Only admin users can change the status.'))
 
+        linked_user = cleaned_data.get('linked_user')
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            raise ValidationError(_('The end date must not be before the start date.'))
+        if linked_user and start_date and end_date:
+            # Not enforced by the database: two concurrent saves may both pass this
+            # check, the overlap filter of the changelist then lists both rests.
+            overlapping = (
+                Rest.objects.filter(linked_user=linked_user)
+                .overlapping(start_date, end_date)
+                .exclude(pk=self.instance.pk)
+            )
+            if overlapping.exists():
+                raise ValidationError(_('This rest overlaps another rest of the deliveryman.'))
+
         return cleaned_data
@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from xnbtd.plannings.compliance import check_compliance
+
+
+class Command(BaseCommand):
+    help = "List the breaches of the working time limits of the drivers over a period"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+        parser.add_argument("end", type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        breaches = check_compliance(options["start"], options["end"])
+        for breach in breaches:
+            self.stdout.write(
+                f"{breach.start:%Y-%m-%d} {breach.username}: {breach.label} "
+                f"({breach.minutes} min, limite {breach.limit} min)"
+            )
+        self.stdout.write(f"{len(breaches)} dépassement(s)")
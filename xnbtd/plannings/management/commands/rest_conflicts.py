@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from xnbtd.plannings.conflicts import find_rest_conflicts
+
+
+class Command(BaseCommand):
+    help = "List the tours logged during a validated rest of their driver"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="First day (YYYY-MM-DD), the first tour by default",
+        )
+        parser.add_argument(
+            "--end",
+            type=date.fromisoformat,
+            help="Last day (YYYY-MM-DD), the last tour by default",
+        )
+
+    def handle(self, *args, **options):
+        conflicts = find_rest_conflicts(options["start"], options["end"])
+        for conflict in conflicts:
+            self.stdout.write(
+                f"{conflict.tour_date:%Y-%m-%d} {conflict.username}: {conflict.carrier} "
+                f"{conflict.tour_name}, rest {conflict.rest.start_date:%Y-%m-%d} "
+                f"- {conflict.rest.end_date:%Y-%m-%d}"
+            )
+        self.stdout.write(f"{len(conflicts)} tours during a rest")
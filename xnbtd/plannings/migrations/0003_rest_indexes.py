@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plannings", "0002_rest"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="rest",
+            index=models.Index(
+                fields=["linked_user", "start_date"],
+                name="plannings_rest_user_start_idx",
+            ),
+        ),
+    ]
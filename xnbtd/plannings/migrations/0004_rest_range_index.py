@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plannings", "0003_rest_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="rest",
+            name="plannings_rest_user_start_idx",
+        ),
+        migrations.AddIndex(
+            model_name="rest",
+            index=models.Index(
+                fields=["linked_user", "start_date", "end_date"],
+                name="plannings_rest_user_range_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Exists, OuterRef
 from django.utils.translation import gettext_lazy as _
 
 
@@ -16,12 +17,44 @@ class Event(models.Model):
         ordering = ['date']
 
 
+class RestQuerySet(models.QuerySet):
+    def overlapping(self, start, end):
+        """
+        Filter the periods sharing at least a day with ``start`` to ``end``, both included
+
+        The range predicate is served by the (linked_user, start_date, end_date) index.
+        """
+        return self.filter(start_date__lte=end, end_date__gte=start)
+
+    def on_leave(self, start, end):
+        """
+        Filter the validated periods overlapping ``start`` to ``end``
+        """
+        return self.filter(status=True).overlapping(start, end)
+
+    def conflicts(self):
+        """
+        Filter the periods overlapping another period of the same driver, in one query
+
+        The admin form rejects overlapping periods, but no database constraint does,
+        so concurrent saves or other writers can still create them.
+        """
+        others = Rest.objects.filter(
+            linked_user=OuterRef("linked_user"),
+            start_date__lte=OuterRef("end_date"),
+            end_date__gte=OuterRef("start_date"),
+        ).exclude(pk=OuterRef("pk"))
+        return self.filter(Exists(others))
+
+
 class Rest(models.Model):
     status = models.BooleanField(verbose_name=_('Status'), default=False)
     linked_user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_('Deliveryman'))
     start_date = models.DateField(verbose_name=_('Start Date'))
     end_date = models.DateField(verbose_name=_('End Date'))
 
+    objects = RestQuerySet.as_manager()
+
     def __str__(self):
         return self.start_date.strftime("%d/%m/%Y") + " - " + self.linked_user.username
 
@@ -29,3 +62,9 @@ class Rest(models.Model):
         verbose_name = _('Rest')
         verbose_name_plural = _('Rests')
         ordering = ['start_date']
+        indexes = [
+            models.Index(
+                fields=['linked_user', 'start_date', 'end_date'],
+                name='plannings_rest_user_range_idx',
+            ),
+        ]
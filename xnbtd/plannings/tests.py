@@ -0,0 +1,242 @@
+from datetime import date, time
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from xnbtd.tests_utils import create_gls, create_tnt
+from xnbtd.tours.models import GLS, TNT
+
+from .compliance import BREAK, DAILY, WEEKLY, check_compliance
+from .conflicts import find_rest_conflicts
+from .models import Rest
+
+
+@override_settings(
+    COMPLIANCE_MAX_DAILY_HOURS=10,
+    COMPLIANCE_MAX_WEEKLY_HOURS=20,
+    COMPLIANCE_BREAK_AFTER_HOURS=6,
+    COMPLIANCE_MIN_BREAK_MINUTES=30,
+)
+class ComplianceTest(TestCase):
+    def setUp(self):
+        self.driver = User.objects.create_user(username='driver', password='driverpassword')
+        self.other = User.objects.create_user(username='other', password='otherpassword')
+
+    def test_days_are_summed_over_carriers(self):
+        """Test the tours of several carriers on the same day add up"""
+        create_gls(
+            self.driver, date=date(2024, 5, 6), beginning_hour=time(6, 0), ending_hour=time(11, 0)
+        )
+        create_tnt(
+            self.driver, date=date(2024, 5, 6), beginning_hour=time(12, 0), ending_hour=time(18, 0)
+        )
+        create_tnt(
+            self.other, date=date(2024, 5, 6), beginning_hour=time(12, 0), ending_hour=time(15, 0)
+        )
+        with self.assertNumQueries(5):
+            breaches = check_compliance(date(2024, 5, 1), date(2024, 5, 31))
+        self.assertEqual(
+            [(breach.username, breach.kind, breach.minutes) for breach in breaches],
+            [('driver', BREAK, 0), ('driver', DAILY, 660)],
+        )
+
+    def test_weeks_overlapping_the_period_are_read_whole(self):
+        """Test a week starting in the previous month counts its first days"""
+        for day in (29, 30):
+            create_tnt(
+                self.driver,
+                date=date(2024, 4, day),
+                beginning_hour=time(7, 0),
+                ending_hour=time(13, 0),
+            )
+        for day in (1, 2):
+            create_tnt(
+                self.driver,
+                date=date(2024, 5, day),
+                beginning_hour=time(7, 0),
+                ending_hour=time(13, 0),
+            )
+        breaches = check_compliance(date(2024, 5, 1), date(2024, 5, 31))
+        self.assertEqual(
+            [(breach.kind, breach.start, breach.minutes) for breach in breaches],
+            [(WEEKLY, date(2024, 4, 29), 1440)],
+        )
+
+    def test_command(self):
+        """Test the command lists the breaches"""
+        create_gls(
+            self.driver, date=date(2024, 5, 6), beginning_hour=time(6, 0), ending_hour=time(17, 0)
+        )
+        output = StringIO()
+        call_command('check_compliance', '2024-05-01', '2024-05-31', stdout=output)
+        self.assertIn('driver: Durée journalière dépassée (660 min', output.getvalue())
+        self.assertIn('2 dépassement(s)', output.getvalue())
+
+
+class RestOverlapTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.driver = User.objects.create_user(username='driver', password='driverpassword')
+        self.rest = Rest.objects.create(
+            linked_user=self.driver,
+            start_date=date(2024, 5, 6),
+            end_date=date(2024, 5, 10),
+            status=True,
+        )
+
+    def test_overlapping_and_on_leave(self):
+        """Test the periods sharing a day with a range are found, bounds included"""
+        self.assertTrue(Rest.objects.overlapping(date(2024, 5, 10), date(2024, 5, 12)).exists())
+        self.assertFalse(Rest.objects.overlapping(date(2024, 5, 11), date(2024, 5, 12)).exists())
+        self.assertEqual(
+            list(Rest.objects.on_leave(date(2024, 5, 1), date(2024, 5, 6))), [self.rest]
+        )
+        Rest.objects.filter(pk=self.rest.pk).update(status=False)
+        self.assertFalse(Rest.objects.on_leave(date(2024, 5, 1), date(2024, 5, 6)).exists())
+
+    def test_overlapping_uses_the_range_index(self):
+        """Test the rests of a driver over a period are read with the composite index"""
+        rests = Rest.objects.filter(linked_user=self.driver)
+        plan = rests.overlapping(date(2024, 3, 1), date(2024, 3, 31)).explain()
+        self.assertIn('plannings_rest_user_range_idx', plan)
+
+    def test_conflicts_of_the_fleet(self):
+        """Test the overlapping periods of every driver are found in one query"""
+        other = Rest.objects.create(
+            linked_user=self.driver, start_date=date(2024, 5, 9), end_date=date(2024, 5, 13)
+        )
+        Rest.objects.create(
+            linked_user=self.admin_user, start_date=date(2024, 5, 6), end_date=date(2024, 5, 10)
+        )
+        with self.assertNumQueries(1):
+            conflicts = list(
+                Rest.objects.overlapping(date(2024, 4, 1), date(2024, 6, 30)).conflicts()
+            )
+        self.assertEqual(conflicts, [self.rest, other])
+
+    def test_admin_rejects_overlapping_rests(self):
+        """Test a rest overlapping another rest of the same driver is not saved"""
+        self.client.login(username='admin', password='adminpassword')
+        url = reverse('admin:plannings_rest_add')
+        data = {'linked_user': self.driver.pk, 'start_date': '2024-05-10', 'end_date': '2024-05-11'}
+        response = self.client.post(url, data, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Rest.objects.count(), 1)
+
+        data['start_date'] = '2024-05-11'
+        response = self.client.post(url, data, secure=True)
+        self.assertEqual(response.status_code, 302)
+
+        # Editing a period does not conflict with itself
+        response = self.client.post(
+            reverse('admin:plannings_rest_change', args=[self.rest.pk]),
+            {
+                'linked_user': self.driver.pk,
+                'start_date': '2024-05-06',
+                'end_date': '2024-05-09',
+                'status': 'on',
+            },
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_admin_overlap_filter(self):
+        """Test the changelist lists the overlapping rests"""
+        Rest.objects.create(
+            linked_user=self.driver, start_date=date(2024, 5, 9), end_date=date(2024, 5, 13)
+        )
+        Rest.objects.create(
+            linked_user=self.driver, start_date=date(2024, 6, 1), end_date=date(2024, 6, 2)
+        )
+        self.client.login(username='admin', password='adminpassword')
+        response = self.client.get(
+            reverse('admin:plannings_rest_changelist'), {'overlap': 'yes'}, secure=True
+        )
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class RestConflictsTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.driver = User.objects.create_user(username='driver', password='driverpassword')
+        self.rest = Rest.objects.create(
+            linked_user=self.driver,
+            start_date=date(2024, 5, 6),
+            end_date=date(2024, 5, 10),
+            status=True,
+        )
+        # Pending rest, and tours of another driver or outside the rest
+        Rest.objects.create(
+            linked_user=self.driver, start_date=date(2024, 6, 3), end_date=date(2024, 6, 4)
+        )
+        create_gls(
+            self.driver, date=date(2024, 6, 3), beginning_hour=time(7, 0), ending_hour=time(15, 0)
+        )
+        create_gls(
+            self.admin_user,
+            date=date(2024, 5, 7),
+            beginning_hour=time(7, 0),
+            ending_hour=time(15, 0),
+        )
+        create_tnt(
+            self.driver, date=date(2024, 5, 11), beginning_hour=time(7, 0), ending_hour=time(15, 0)
+        )
+
+        self.tnt = create_tnt(
+            self.driver, date=date(2024, 5, 10), beginning_hour=time(7, 0), ending_hour=time(15, 0)
+        )
+        self.gls = create_gls(
+            self.driver, date=date(2024, 5, 6), beginning_hour=time(7, 0), ending_hour=time(15, 0)
+        )
+
+    def test_tours_during_validated_rests(self):
+        """Test the tours inside a validated rest of their driver are found in two queries"""
+        with self.assertNumQueries(2):
+            conflicts = find_rest_conflicts()
+        self.assertEqual(
+            [(conflict.model, conflict.tour_id, conflict.rest) for conflict in conflicts],
+            [(GLS, self.gls.pk, self.rest), (TNT, self.tnt.pk, self.rest)],
+        )
+        self.assertEqual(find_rest_conflicts(date(2024, 5, 8), date(2024, 5, 31))[0].model, TNT)
+
+    def test_admin_view_and_command(self):
+        """Test the report is shown in the rests admin and by the command"""
+        self.client.login(username='admin', password='adminpassword')
+        response = self.client.get(
+            reverse('admin:plannings_rest_tour_conflicts'),
+            {'start': '2024-01-01', 'end': '2024-12-31'},
+            secure=True,
+        )
+        self.assertEqual(len(response.context['conflicts']), 2)
+        self.assertContains(response, reverse('admin:tours_gls_change', args=[self.gls.pk]))
+
+        # A driver sees their own tours, without a link to the tours they may not open
+        self.driver.is_staff = True
+        self.driver.save()
+        self.driver.user_permissions.add(
+            Permission.objects.get(content_type__app_label='plannings', codename='view_rest'),
+            Permission.objects.get(content_type__app_label='tours', codename='view_tnt'),
+        )
+        self.client.login(username='driver', password='driverpassword')
+        response = self.client.get(
+            reverse('admin:plannings_rest_tour_conflicts'),
+            {'start': '2024-01-01', 'end': '2024-12-31'},
+            secure=True,
+        )
+        self.assertEqual(
+            [tour_url for _, tour_url in response.context['conflicts']],
+            [None, reverse('admin:tours_tnt_change', args=[self.tnt.pk])],
+        )
+        self.assertNotContains(response, reverse('admin:tours_gls_change', args=[self.gls.pk]))
+
+        output = StringIO()
+        call_command('rest_conflicts', '--start', '2024-05-01', stdout=output)
+        self.assertIn('2024-05-10 driver', output.getvalue())
+        self.assertIn('2 tours during a rest', output.getvalue())
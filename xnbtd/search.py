@@ -0,0 +1,160 @@
+"""
+    Changelist search classifying each search term by type.
+
+    The default admin search runs ``icontains`` on every field of ``search_fields``
+    for every term, integer and date columns included, so no index can be used.
+    Here each term is matched according to what it looks like:
+
+    * an integer is matched exactly on the ``search_number_fields`` able to hold
+      it and on ``search_exact_fields``, and as a year on ``search_date_fields``,
+    * a decimal number (``250.75``, ``250,75``) is matched exactly on the decimal
+      fields of ``search_number_fields`` able to hold it,
+    * a date (``04/03/2024``, ``2024-03-04``) or a month (``03/2024``) becomes a date
+      range on ``search_date_fields``,
+    * a time (``07:30``, ``7h30``) is matched exactly on ``search_time_fields``,
+    * any other term is searched with ``icontains`` on ``search_fields`` only, or
+      with the full-text index of the fields of ``search_fulltext_fields`` when the
+      database has one (see ``xnbtd.fulltext``).
+"""
+
+import re
+from calendar import monthrange
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import BigIntegerField, DecimalField, FloatField, IntegerField, Q
+from django.utils.text import smart_split, unescape_string_literal
+
+from xnbtd.fulltext import fulltext_match
+
+
+INTEGER_RE = re.compile(r"^\d+$")
+DECIMAL_RE = re.compile(r"^\d+[.,]\d+$")
+MONTH_RE = re.compile(r"^(\d{1,2})[/-](\d{4})$")
+TIME_RE = re.compile(r"^(\d{1,2})[:hH](\d{2})$")
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d")
+
+
+def parse_date_range(term):
+    """
+    Get the ``(first_day, last_day)`` range described by a date or month term, or None
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            day = datetime.strptime(term, date_format).date()
+        except ValueError:
+            continue
+        return day, day
+    if match := MONTH_RE.match(term):
+        month, year = int(match.group(1)), int(match.group(2))
+        if 1 <= month <= 12:
+            return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+    return None
+
+
+def parse_number(field, term):
+    """
+    Get the value of a number term for a field, or None when the field cannot hold it
+
+    A value out of the range of the database integers or with more digits than a
+    decimal field would make the query fail rather than match no row.
+    """
+    try:
+        value = field.to_python(term)
+        field.run_validators(value)
+    except ValidationError:
+        return None
+    if isinstance(field, IntegerField):
+        low, high = connection.ops.integer_field_range(field.get_internal_type())
+        # SQLite gives no range but only binds 64-bit integers
+        low = -BigIntegerField.MAX_BIGINT - 1 if low is None else low
+        high = BigIntegerField.MAX_BIGINT if high is None else high
+        if not low <= value <= high:
+            return None
+    return value
+
+
+def parse_time(term):
+    if match := TIME_RE.match(term):
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour < 24 and minute < 60:
+            return time(hour, minute)
+    return None
+
+
+class TypedSearchMixin:
+    """
+    ModelAdmin mixin matching each search term on the columns of its type
+    """
+
+    search_number_fields = ()
+    search_exact_fields = ()
+    search_date_fields = ()
+    search_time_fields = ()
+    search_fulltext_fields = ()
+
+    def get_text_search_query(self, request, term):
+        query = Q()
+        for field_name in self.get_search_fields(request):
+            match = None
+            if field_name in self.search_fulltext_fields:
+                match = fulltext_match(self.model, field_name, term)
+            query |= match if match is not None else Q(**{f"{field_name}__icontains": term})
+        return query
+
+    def get_search_term_query(self, request, term):
+        """
+        Build the filter matching a single search term
+        """
+        if INTEGER_RE.match(term):
+            query = Q()
+            for field_name in self.search_number_fields:
+                number = parse_number(self.model._meta.get_field(field_name), term)
+                if number is not None:
+                    query |= Q(**{field_name: number})
+            for field_name in self.search_exact_fields:
+                query |= Q(**{field_name: term})
+            if len(term) == 4:
+                for field_name in self.search_date_fields:
+                    query |= Q(**{f"{field_name}__year": int(term)})
+            return query
+
+        if DECIMAL_RE.match(term):
+            query = Q()
+            for field_name in self.search_number_fields:
+                field = self.model._meta.get_field(field_name)
+                if isinstance(field, (DecimalField, FloatField)):
+                    number = parse_number(field, Decimal(term.replace(",", ".")))
+                    if number is not None:
+                        query |= Q(**{field_name: number})
+            if query:
+                return query
+
+        if (date_range := parse_date_range(term)) and self.search_date_fields:
+            first_day, last_day = date_range
+            query = Q()
+            for field_name in self.search_date_fields:
+                query |= Q(**{f"{field_name}__gte": first_day, f"{field_name}__lte": last_day})
+            return query
+
+        if (value := parse_time(term)) and self.search_time_fields:
+            query = Q()
+            for field_name in self.search_time_fields:
+                query |= Q(**{field_name: value})
+            return query
+
+        return self.get_text_search_query(request, term)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            query = self.get_search_term_query(request, bit)
+            # A term matching no column of its type matches no row
+            queryset = queryset.filter(query) if query else queryset.none()
+        return queryset, False
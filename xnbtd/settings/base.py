@@ -135,6 +135,64 @@ STATIC_ROOT = str(__Path(BASE_PATH, 'static'))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = str(__Path(BASE_PATH, 'media'))
 
+# _____________________________________________________________________________
+# Cache
+
+# The cached invoices, tariffs and filter choices are invalidated by renewing version
+# tokens in the cache, so every worker process must share the same cache: the file-based
+# cache is shared by the processes of one host, use Memcached, Redis or the database cache
+# when the site is served by several hosts. With a per-process cache (LocMemCache), an
+# invalidation only reaches the process which made it and the other processes serve stale
+# data until their entries expire.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(__Path(BASE_PATH, 'cache')),
+    },
+}
+
+# _____________________________________________________________________________
+# Pricing
+
+# Seconds a computed month invoice stays in the cache. Invoices are invalidated when a tour
+# of their month changes, the timeout only bounds staleness when the cache is not shared.
+PRICING_CACHE_TIMEOUT = 10 * 60
+
+# Seconds the compiled tariffs of a process are used before being loaded again, unless a
+# tariff change renews their version token in the shared cache first.
+TARIFFS_CACHE_TIMEOUT = 5 * 60
+
+# Seconds the row counts of the changelists using keyset pagination stay in the cache.
+# The counts are not invalidated when a row changes, they are only refreshed on expiry.
+CHANGELIST_COUNT_CACHE_TIMEOUT = 5 * 60
+
+# Seconds the choices of the driver, tour number and license plate filters stay in the
+# cache. They are invalidated when a tour of the same carrier is saved or deleted, the
+# timeout only bounds staleness when the cache is not shared.
+FILTER_CHOICES_CACHE_TIMEOUT = 15 * 60
+
+# Exports of more rows are written in the background by the run_export_jobs command,
+# in EXPORT_JOB_WORKERS processes by default, and downloaded from the admin.
+EXPORT_JOB_THRESHOLD = 5000
+EXPORT_JOB_WORKERS = 2
+# The files are written out of MEDIA_ROOT, so that they are only sent by the admin to the
+# user who asked for them. They are deleted with their job after EXPORT_JOB_RETENTION_DAYS.
+EXPORT_ROOT = str(__Path(BASE_PATH, 'exports'))
+EXPORT_JOB_RETENTION_DAYS = 7
+# Seconds after which a running job is considered interrupted, its worker having died
+EXPORT_JOB_TIMEOUT = 60 * 60
+
+# _____________________________________________________________________________
+# Working time compliance
+
+# Limits checked by xnbtd.plannings.compliance on the hours of each driver, summed over
+# the tours of every carrier: worked hours per day and per week (Monday to Sunday), and
+# minimum break of a day with more than COMPLIANCE_BREAK_AFTER_HOURS worked hours.
+COMPLIANCE_MAX_DAILY_HOURS = 10
+COMPLIANCE_MAX_WEEKLY_HOURS = 48
+COMPLIANCE_BREAK_AFTER_HOURS = 6
+COMPLIANCE_MIN_BREAK_MINUTES = 30
+
 # _____________________________________________________________________________
 # cut 'pathname' in log output
 
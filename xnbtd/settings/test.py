@@ -8,3 +8,6 @@ DATABASES = {
         'DEBUG_NAME': 'xnbtd-debug.sqlite3',
     },
 }
+
+# The tests run in a single process, each one starting from an empty cache
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
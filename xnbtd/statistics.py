@@ -0,0 +1,125 @@
+"""
+    Statistics shown in the sidebar of the changelists.
+
+    Each admin declares a ``list_statistic`` list whose entries are either
+    ``(column, label)`` or ``(column, label, function)`` with ``function`` one of
+    ``"sum"`` (the default), ``"avg"``, ``"count"`` or ``"hours"``. A ``"hours"`` entry
+    takes a duration expression in seconds as column, such as ``worked_seconds()``.
+    All the entries of an admin are computed together in a single ``aggregate()`` call.
+"""
+
+from collections import namedtuple
+
+from django.db.models import Avg, Case, Count, F, IntegerField, Sum, When
+from django.db.models.functions import ExtractHour, ExtractMinute, ExtractSecond
+from django.db.models.lookups import LessThan
+
+
+class Hours(Sum):
+    """Sum of a duration expressed in seconds, reported in hours"""
+
+
+AGGREGATE_FUNCTIONS = {
+    "sum": Sum,
+    "avg": Avg,
+    "count": Count,
+    "hours": Hours,
+}
+
+Statistic = namedtuple("Statistic", ["column", "label", "function"])
+
+
+def parse_statistics(list_statistic):
+    """
+    Normalize the entries of a ``list_statistic`` declaration
+
+    Arguments:
+        list_statistic (list): ``(column, label)`` or ``(column, label, function)`` tuples.
+
+    Returns:
+        list: A list of ``Statistic`` tuples.
+    """
+    statistics = []
+    for entry in list_statistic or []:
+        column, label, *rest = entry
+        function = rest[0] if rest else "sum"
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f"Unknown statistic function {function!r} for column {column!r}")
+        statistics.append(Statistic(column, label, function))
+    return statistics
+
+
+def time_to_seconds(expression):
+    """
+    Build a database expression converting a time of day to a number of seconds
+
+    Arguments:
+        expression (str or Expression): A ``TimeField`` name or a time expression.
+
+    Returns:
+        Expression: An integer expression, usable in ``aggregate()`` and ``annotate()``.
+    """
+    return (
+        ExtractHour(expression) * 3600 + ExtractMinute(expression) * 60 + ExtractSecond(expression)
+    )
+
+
+def worked_seconds(start="beginning_hour", end="ending_hour"):
+    """
+    Build a database expression for the duration between two ``TimeField`` columns
+
+    A tour ending before it began is considered to end on the next day.
+
+    Arguments:
+        start (str): The name of the column holding the beginning of the tour.
+        end (str): The name of the column holding the end of the tour.
+
+    Returns:
+        Expression: The duration in seconds as an integer expression.
+    """
+    duration = time_to_seconds(end) - time_to_seconds(start)
+    return Case(
+        When(LessThan(F(end), F(start)), then=duration + 24 * 3600),
+        default=duration,
+        output_field=IntegerField(),
+    )
+
+
+def compute_statistics(queryset, list_statistic):
+    """
+    Compute every statistic of a changelist
+
+    ``TimeField`` columns and ``"hours"`` statistics are summed as durations by the
+    database and returned in hours.
+
+    Arguments:
+        queryset (QuerySet): The filtered, unsliced queryset of the changelist.
+        list_statistic (list): The ``list_statistic`` declaration of the admin.
+
+    Returns:
+        list: A list of ``(label, value)`` tuples, ``value`` being None when there is no data.
+    """
+    statistics = parse_statistics(list_statistic)
+    if not statistics:
+        return []
+
+    model = queryset.model
+    aggregates = {}
+    for index, statistic in enumerate(statistics):
+        column, function = statistic.column, statistic.function
+        if isinstance(column, str) and function == "sum":
+            if model._meta.get_field(column).get_internal_type() == "TimeField":
+                column, function = time_to_seconds(column), "hours"
+        aggregates[f"statistic_{index}"] = AGGREGATE_FUNCTIONS[function](column)
+
+    values = queryset.order_by().aggregate(**aggregates)
+
+    results = []
+    for index, statistic in enumerate(statistics):
+        value = values[f"statistic_{index}"]
+        if value is not None and isinstance(aggregates[f"statistic_{index}"], Hours):
+            value = value / 3600
+        if value is not None and statistic.function != "count":
+            value = round(value, 2)
+        results.append((statistic.label, value))
+    return results
@@ -0,0 +1,111 @@
+"""
+    Builders of the tours used by the tests of every app.
+
+    Each builder creates a tour of a carrier with default counters, the keyword
+    arguments overriding the defaults.
+"""
+
+from datetime import date, time
+
+from xnbtd.tours.models import GLS, TNT, ChronopostDelivery, ChronopostPickup, Ciblex
+
+
+def create_gls(user, **kwargs):
+    values = {
+        'linked_user': user,
+        'name': 'G1',
+        'date': date(2024, 5, 2),
+        'beginning_hour': time(7, 0),
+        'ending_hour': time(16, 0),
+        'license_plate': 'ab123cd',
+        'points_charges': 0,
+        'points_delivered': 0,
+        'packages_charges': 0,
+        'packages_delivered': 0,
+        'eo': 0,
+        'pickup_point': 0,
+        'full_km': 0,
+    }
+    values.update(kwargs)
+    return GLS.objects.create(**values)
+
+
+def create_tnt(user, **kwargs):
+    values = {
+        'linked_user': user,
+        'name': 'T1',
+        'date': date(2024, 3, 4),
+        'beginning_hour': time(7, 0),
+        'ending_hour': time(15, 30),
+        'license_plate': 'ab123cd',
+        'client_numbers': 10,
+        'refused': 0,
+        'avp': 0,
+        'cad': 0,
+        'totals_clients': 10,
+        'occasional_abductions': 0,
+        'regular_abductions': 0,
+        'totals_clients_abductions': 0,
+        'kilometers': 120,
+    }
+    values.update(kwargs)
+    return TNT.objects.create(**values)
+
+
+def create_chronopost_delivery(user, **kwargs):
+    values = {
+        'linked_user': user,
+        'name': 'CD1',
+        'date': date(2024, 5, 2),
+        'beginning_hour': time(7, 0),
+        'ending_hour': time(15, 0),
+        'license_plate': 'ab123cd',
+        'charged_packages': 0,
+        'charged_points': 0,
+        'including_ip': 0,
+        'relay': 0,
+        'return_packages': 0,
+        'return_points': 0,
+        'overdue': 0,
+        'anomalies': 0,
+        'total_points': 0,
+        'full_km': 0,
+    }
+    values.update(kwargs)
+    return ChronopostDelivery.objects.create(**values)
+
+
+def create_chronopost_pickup(user, **kwargs):
+    values = {
+        'linked_user': user,
+        'name': 'CP1',
+        'date': date(2024, 5, 2),
+        'beginning_hour': time(14, 0),
+        'ending_hour': time(19, 0),
+        'license_plate': 'ab123cd',
+        'esd': 0,
+        'picked_points': 0,
+        'poste': 0,
+    }
+    values.update(kwargs)
+    return ChronopostPickup.objects.create(**values)
+
+
+def create_ciblex(user, **kwargs):
+    values = {
+        'linked_user': user,
+        'name': 'C1',
+        'date': date(2024, 5, 2),
+        'beginning_hour': time(6, 0),
+        'ending_hour': time(14, 0),
+        'license_plate': 'ab123cd',
+        'nights': 0,
+        'days': 1,
+        'avp': 0,
+        'spare_part': 0,
+        'synchro': 0,
+        'relais': 0,
+        'morning_pickup': 0,
+    }
+    values.update(kwargs)
+    return Ciblex.objects.create(**values)
@@ -1,12 +1,33 @@
+import io
+
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.admin import GenericTabularInline
-from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.utils.safestring import mark_safe
 
 from xnbtd.analytics.export import export_route_as_csv, export_single_route_as_csv
-
-from .models import GLS, TNT, BreakTime, ChronopostDelivery, ChronopostPickup, Ciblex
+from xnbtd.analytics.pricing import get_carrier, invalidate_month
+from xnbtd.analytics.views import has_tours_permission
+from xnbtd.pagination import KeysetChangeList
+from xnbtd.search import TypedSearchMixin
+
+from .filters import CachedAllValuesFieldListFilter, CachedRelatedFieldListFilter
+from .importer import import_tours
+from .models import (
+    GLS,
+    TNT,
+    BreakTime,
+    ChronopostDelivery,
+    ChronopostPickup,
+    Ciblex,
+    SHDEntry,
+)
 
 
 class BreakTimeInline(GenericTabularInline):
@@ -17,16 +38,66 @@ class BreakTimeInline(GenericTabularInline):
     fields = ["start_time", "end_time"]
 
 
-class BaseAdmin(admin.ModelAdmin):
+class SHDEntryFormSet(BaseInlineFormSet):
+    """
+    Number the new SHD entries of a tour together and insert them in one query
+    """
+
+    def save_new_objects(self, commit=True):
+        self.new_objects = []
+        forms = [
+            form
+            for form in self.extra_forms
+            if form.has_changed() and not (self.can_delete and self._should_delete_form(form))
+        ]
+        if not forms:
+            return self.new_objects
+
+        with transaction.atomic():
+            numbers = SHDEntry.objects.allocate_numbers(self.instance, len(forms))
+            for form, number in zip(forms, numbers):
+                entry = self.save_new(form, commit=False)
+                entry.number = number
+                self.new_objects.append(entry)
+            if commit:
+                SHDEntry.objects.bulk_create(self.new_objects)
+                # bulk_create() sends no post_save signal to invalidate the pricing
+                invalidate_month("gls", self.instance.date.year, self.instance.date.month)
+        if not commit:
+            self.saved_forms.extend(forms)
+        return self.new_objects
+
+
+class SHDEntryInline(admin.TabularInline):
+    model = SHDEntry
+    formset = SHDEntryFormSet
+    extra = 1
+    fields = ["number", "value"]
+    readonly_fields = ["number"]
+
+
+class BaseAdmin(TypedSearchMixin, admin.ModelAdmin):
     inlines = [BreakTimeInline]
     change_list_template = "xnbtd/admin/change_list.html"
     change_form_template = "xnbtd/admin/change_form.html"
     actions = [export_route_as_csv]
+    # Search terms are matched by type: the counters of each carrier are listed
+    # in search_number_fields, only text terms reach search_fields
+    search_exact_fields = ["name"]
+    search_date_fields = ["date"]
+    search_time_fields = ["beginning_hour", "ending_hour"]
+    search_fulltext_fields = ["comments"]
+    # Paginate on (date, id) with cached counts instead of OFFSET and COUNT(*)
+    keyset_pagination = False
+
+    def get_changelist(self, request, **kwargs):
+        if self.keyset_pagination:
+            return KeysetChangeList
+        return super().get_changelist(request, **kwargs)
 
     def display_breaks(self, obj):
-        breaks = BreakTime.objects.filter(
-            content_type=ContentType.objects.get_for_model(obj), object_id=obj.id
-        )
+        # Breaks are prefetched by get_queryset(), ordered by start time
+        breaks = obj.breaks.all()
         if not breaks:
             return "-"
         breaks_html = [
@@ -39,7 +110,9 @@ class BaseAdmin(admin.ModelAdmin):
     display_breaks.short_description = "Pauses"
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        qs = super().get_queryset(request).prefetch_related(
+            Prefetch("breaks", queryset=BreakTime.objects.order_by("start_time"))
+        )
         return qs if request.user.is_superuser else qs.filter(linked_user=request.user)
 
     def get_changeform_initial_data(self, request):
@@ -59,8 +132,48 @@ class BaseAdmin(admin.ModelAdmin):
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
         extra_context["list_statistic"] = self.list_statistic
+        # Show the monthly and yearly pricing of the carrier in the sidebar
+        extra_context["pricing"] = get_carrier(self.model) is not None
+        if self.has_add_permission(request):
+            opts = self.model._meta
+            extra_context["import_url"] = reverse(
+                f"admin:{opts.app_label}_{opts.model_name}_import"
+            )
+        if has_tours_permission(request.user):
+            extra_context["consolidated_export_url"] = reverse("analytics:consolidated_export")
         return super().changelist_view(request, extra_context=extra_context)
 
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name=f"{opts.app_label}_{opts.model_name}_import",
+            ),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Import tours from a CSV file, a driver only importing their own tours"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        result = None
+        if request.method == "POST" and request.FILES.get("file"):
+            users = None
+            if not request.user.is_superuser:
+                users = {request.user.get_username(): request.user.pk}
+            lines = io.TextIOWrapper(request.FILES["file"].file, encoding="utf-8-sig", newline="")
+            result = import_tours(self.model, lines, users)
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Importer des tournées {self.model._meta.verbose_name}",
+            "opts": self.model._meta,
+            "result": result,
+        }
+        return TemplateResponse(request, "xnbtd/admin/import.html", context)
+
     def response_change(self, request, obj):
         """Add custom actions to the change form"""
         if '_export_csv' in request.POST:
@@ -69,7 +182,8 @@ class BaseAdmin(admin.ModelAdmin):
 
 
 class GLSAdmin(BaseAdmin):
-    inlines = [BreakTimeInline]
+    inlines = [BreakTimeInline, SHDEntryInline]
+    keyset_pagination = True
     date_hierarchy = "date"
     list_display = (
         "name",
@@ -88,18 +202,23 @@ class GLSAdmin(BaseAdmin):
         "display_breaks",
         "comments",
     )
-    list_filter = ("date", "linked_user", "name", "license_plate")
+    list_filter = (
+        "date",
+        ("linked_user", CachedRelatedFieldListFilter),
+        ("name", CachedAllValuesFieldListFilter),
+        ("license_plate", CachedAllValuesFieldListFilter),
+    )
     list_statistic = [
         ("packages_delivered", "Total Colis livrés"),
+        (F("worked_minutes") * 60, "Total heures travaillées", "hours"),
     ]
     search_fields = [
         'linked_user__username',
         'name',
-        'date',
-        'beginning_hour',
-        'ending_hour',
         'license_plate',
         'comments',
+    ]
+    search_number_fields = [
         'points_charges',
         'points_delivered',
         'packages_charges',
@@ -131,51 +250,9 @@ class GLSAdmin(BaseAdmin):
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
         extra_context["list_statistic"] = self.list_statistic
-
-        # Get date hierarchy information if available
-        date_hierarchy_choice = None
-        if self.date_hierarchy:
-            # Récupérer tous les paramètres GET
-            print(f"DEBUG: all GET params: {request.GET}")
-
-            # Vérifier tous les paramètres pour trouver ceux liés à la hiérarchie de dates
-            date_params = {}
-            for key, value in request.GET.items():
-                if key.startswith(f'{self.date_hierarchy}__'):
-                    date_part = key.split('__')[1]  # Extraire 'year', 'month', etc.
-                    date_params[date_part] = value
-                    print(f"DEBUG: Found date param: {date_part} = {value}")
-
-            # Si nous avons à la fois l'année et le mois
-            if 'year' in date_params and 'month' in date_params:
-                date_hierarchy_choice = {'year': date_params['year'], 'month': date_params['month']}
-                print(f"DEBUG: date_hierarchy_choice set to {date_hierarchy_choice}")
-
-                # Ajouter des informations sur les données GLS pour ce mois
-                from calendar import monthrange
-                from datetime import datetime
-
-                try:
-                    year = int(date_params['year'])
-                    month = int(date_params['month'])
-
-                    start_date = datetime(year, month, 1).date()
-                    _, last_day = monthrange(year, month)
-                    end_date = datetime(year, month, last_day).date()
-
-                    # Obtenir les données GLS pour ce mois
-                    gls_data = self.model.objects.filter(date__gte=start_date, date__lte=end_date)
-                    print(f"DEBUG: Found {gls_data.count()} GLS entries for {month}/{year}")
-
-                    # Ajouter ces informations au contexte
-                    extra_context['gls_month_data'] = gls_data
-                except (ValueError, TypeError) as e:
-                    print(f"DEBUG: Error processing date params: {e}")
-
-        extra_context['date_hierarchy_choice'] = date_hierarchy_choice
         return super().changelist_view(request, extra_context=extra_context)
 
-    change_list_template = "xnbtd/admin/gls_change_list.html"
+    change_list_template = "xnbtd/admin/change_list.html"
 
 
 class TNTAdmin(BaseAdmin):
@@ -199,17 +276,23 @@ class TNTAdmin(BaseAdmin):
         "display_breaks",
         "comments",
     )
-    list_filter = ("date", "linked_user", "name", "license_plate")
+    list_filter = (
+        "date",
+        ("linked_user", CachedRelatedFieldListFilter),
+        ("name", CachedAllValuesFieldListFilter),
+        ("license_plate", CachedAllValuesFieldListFilter),
+    )
     list_statistic = [
         ("totals_clients", "Total clients"),
+        (F("worked_minutes") * 60, "Total heures travaillées", "hours"),
     ]
     search_fields = [
         'linked_user__username',
         'name',
-        'date',
-        'beginning_hour',
-        'ending_hour',
         'license_plate',
+        'comments',
+    ]
+    search_number_fields = [
         'client_numbers',
         'refused',
         'avp',
@@ -248,6 +331,7 @@ class TNTAdmin(BaseAdmin):
 
 
 class ChronopostDeliveryAdmin(BaseAdmin):
+    keyset_pagination = True
     date_hierarchy = "date"
     list_display = (
         "name",
@@ -269,17 +353,23 @@ class ChronopostDeliveryAdmin(BaseAdmin):
         "display_breaks",
         "comments",
     )
-    list_filter = ("date", "linked_user", "name", "license_plate")
+    list_filter = (
+        "date",
+        ("linked_user", CachedRelatedFieldListFilter),
+        ("name", CachedAllValuesFieldListFilter),
+        ("license_plate", CachedAllValuesFieldListFilter),
+    )
     list_statistic = [
         ("total_points", "Total des points"),
+        (F("worked_minutes") * 60, "Total heures travaillées", "hours"),
     ]
     search_fields = [
         'linked_user__username',
         'name',
-        'date',
-        'beginning_hour',
-        'ending_hour',
         'license_plate',
+        'comments',
+    ]
+    search_number_fields = [
         'charged_packages',
         'charged_points',
         'including_ip',
@@ -321,6 +411,7 @@ class ChronopostDeliveryAdmin(BaseAdmin):
 
 
 class ChronopostPickupAdmin(BaseAdmin):
+    keyset_pagination = True
     date_hierarchy = "date"
     list_display = (
         "name",
@@ -335,17 +426,23 @@ class ChronopostPickupAdmin(BaseAdmin):
         "display_breaks",
         "comments",
     )
-    list_filter = ("date", "linked_user", "name", "license_plate")
+    list_filter = (
+        "date",
+        ("linked_user", CachedRelatedFieldListFilter),
+        ("name", CachedAllValuesFieldListFilter),
+        ("license_plate", CachedAllValuesFieldListFilter),
+    )
     list_statistic = [
         ("picked_points", "Total des points ramassés"),
+        (F("worked_minutes") * 60, "Total heures travaillées", "hours"),
     ]
     search_fields = [
         'linked_user__username',
         'name',
-        'date',
-        'beginning_hour',
-        'ending_hour',
         'license_plate',
+        'comments',
+    ]
+    search_number_fields = [
         'esd',
         'picked_points',
         'poste',
@@ -399,18 +496,24 @@ class CiblexAdmin(BaseAdmin):
         "display_breaks",
         "comments",
     )
-    list_filter = ("date", "linked_user", "name", "license_plate")
+    list_filter = (
+        "date",
+        ("linked_user", CachedRelatedFieldListFilter),
+        ("name", CachedAllValuesFieldListFilter),
+        ("license_plate", CachedAllValuesFieldListFilter),
+    )
     list_statistic = [
         ("days", "Total jours"),
+        (F("worked_minutes") * 60, "Total heures travaillées", "hours"),
     ]
     search_fields = [
         'linked_user__username',
         'name',
-        'date',
-        'beginning_hour',
-        'ending_hour',
         'license_plate',
+        'comments',
         'type',
+    ]
+    search_number_fields = [
         'nights',
         'days',
         'avp',
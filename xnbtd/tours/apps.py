@@ -6,3 +6,6 @@ class ToursConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'xnbtd.tours'
     verbose_name = _('app_tours_name')
+
+    def ready(self):
+        from xnbtd.tours import signals  # noqa:F401
@@ -0,0 +1,98 @@
+"""
+    Changelist filters serving their choices from the cache.
+
+    Django computes the choices of the driver, tour number and license plate
+    filters with a DISTINCT query over the whole table on every changelist. Here
+    the choices are kept in the cache per model and per queryset scope (a driver
+    only sees their own tours). Each tour model has a version token in the cache
+    which is renewed by ``invalidate_choices()`` when one of its tours is saved or
+    deleted, see ``xnbtd.tours.signals``. The cache must be shared by the worker
+    processes for the new token to reach all of them (see ``CACHES`` in the
+    settings), else ``FILTER_CHOICES_CACHE_TIMEOUT`` bounds the staleness.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+
+
+def choices_version_key(model):
+    return f"filters:{model._meta.label_lower}:version"
+
+
+def get_choices_version(model):
+    key = choices_version_key(model)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+def invalidate_choices(model):
+    """
+    Drop every cached filter choice of a model by renewing its version token
+    """
+    cache.set(choices_version_key(model), uuid.uuid4().hex, None)
+
+
+def get_cached_choices(scope, field_path, compute):
+    """
+    Get the choices of a filter from the cache, computing and storing them on a miss
+
+    Args:
+        scope: The queryset of the changelist before filtering, giving the visible rows
+        field_path: The filtered field
+        compute: The function computing the list of choices
+
+    Returns:
+        list: The choices
+    """
+    try:
+        scope_hash = hashlib.md5(str(scope.query).encode()).hexdigest()
+    except EmptyResultSet:
+        return []
+
+    model = scope.model
+    version = get_choices_version(model)
+    key = f"filters:{model._meta.label_lower}:{field_path}:{version}:{scope_hash}"
+    choices = cache.get(key)
+    if choices is None:
+        choices = list(compute())
+        cache.set(key, choices, settings.FILTER_CHOICES_CACHE_TIMEOUT)
+    return choices
+
+
+class CachedRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Filter on a foreign key listing the related objects used by the visible rows
+    """
+
+    def field_choices(self, field, request, model_admin):
+        scope = model_admin.get_queryset(request)
+
+        def compute():
+            used = scope.order_by().values(f"{self.field_path}__pk")
+            ordering = self.field_admin_ordering(field, request, model_admin)
+            return field.get_choices(
+                include_blank=False, ordering=ordering, limit_choices_to={"pk__in": used}
+            )
+
+        return get_cached_choices(scope, self.field_path, compute)
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """
+    Filter listing the distinct values of a column among the visible rows
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # The parent built a lazy DISTINCT queryset, not evaluated yet
+        self.lookup_choices = get_cached_choices(
+            model_admin.get_queryset(request), field_path, lambda: self.lookup_choices
+        )
@@ -0,0 +1,207 @@
+"""
+    Bulk import of tours from CSV files.
+
+    The file has a header line naming the columns with the field names or the
+    verbose names of the tour model, as written by the CSV export. The driver is
+    given by username, the breaks as ``12:00 - 12:45`` ranges and, for GLS, the SHD
+    values as a list separated by ``;``. Unknown columns are ignored.
+
+    The lines are read one at a time and validated with the form fields of the
+    model, without query. The valid tours are inserted by batches with
+    ``bulk_create()``, with their breaks and SHD entries. An invalid line is
+    reported with its number and does not stop the import. A file which is not
+    UTF-8 or not CSV stops the import where it becomes unreadable, with an error
+    for the whole file, the tours read before being kept. As ``bulk_create()``
+    sends no signal, the caches depending on the tours are invalidated at the end,
+    and as it does not call ``save()`` the stored durations are computed while
+    reading the lines.
+"""
+
+import csv
+import re
+from dataclasses import dataclass, field
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from xnbtd.analytics.pricing import get_carrier, invalidate_month
+from xnbtd.tours.filters import invalidate_choices
+from xnbtd.tours.models import GLS, BreakTime, SHDEntry
+
+
+IMPORT_BATCH_SIZE = 500
+
+USER_COLUMNS = {"linked_user", "livreur", "username"}
+BREAK_COLUMNS = {"breaks", "pauses"}
+SHD_COLUMNS = {"shd"}
+
+BREAK_RE = re.compile(r"(\d{1,2}:\d{2}(?::\d{2})?)\s*-\s*(\d{1,2}:\d{2}(?::\d{2})?)")
+SHD_SEPARATOR_RE = re.compile(r"[;,\s]+")
+TIME_FIELD = forms.TimeField()
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    # (line number, message), the line number being None for the whole file
+    errors: list = field(default_factory=list)
+
+
+def get_import_fields(model):
+    """
+    Map the accepted column names to the editable fields of a tour model
+
+    Returns:
+        dict: Lowercase column name -> ``(model field, form field)``
+    """
+    fields = {}
+    for model_field in model._meta.concrete_fields:
+        if not model_field.editable or model_field.primary_key or model_field.is_relation:
+            continue
+        column = (model_field, model_field.formfield())
+        fields[model_field.name.lower()] = column
+        fields[str(model_field.verbose_name).lower()] = column
+    return fields
+
+
+def read_breaks(value):
+    """
+    Parse the ``12:00 - 12:45`` ranges of a cell into ``(start_time, end_time)`` pairs
+    """
+    ranges = BREAK_RE.findall(value or "")
+    if value and value.strip() not in ("", "-") and not ranges:
+        raise ValidationError(f"Pauses invalides : {value}")
+    return [(TIME_FIELD.clean(start), TIME_FIELD.clean(end)) for start, end in ranges]
+
+
+def read_shd(value):
+    try:
+        return [int(number) for number in SHD_SEPARATOR_RE.split((value or "").strip()) if number]
+    except ValueError:
+        raise ValidationError(f"SHD invalides : {value}")
+
+
+def read_tour(model, columns, users, row):
+    """
+    Build an unsaved tour, its breaks and its SHD values from a line of the file
+
+    Raises:
+        ValidationError: If a cell is not valid
+    """
+    values = {}
+    errors = []
+    breaks, shd = [], []
+    for name, value in row.items():
+        key = (name or "").strip().lower()
+        try:
+            if key in USER_COLUMNS:
+                if value not in users:
+                    raise ValidationError(f"Livreur inconnu : {value}")
+                values["linked_user_id"] = users[value]
+            elif key in BREAK_COLUMNS:
+                breaks = read_breaks(value)
+            elif key in SHD_COLUMNS and model is GLS:
+                shd = read_shd(value)
+            elif key in columns:
+                model_field, form_field = columns[key]
+                values[model_field.attname] = form_field.clean(value)
+        except ValidationError as error:
+            errors.extend(f"{name} : {message}" for message in error.messages)
+
+    if "linked_user_id" not in values:
+        errors.append("Livreur manquant")
+    missing = {
+        str(model_field.verbose_name)
+        for model_field, _ in columns.values()
+        if model_field.attname not in values
+        and not model_field.has_default()
+        and not model_field.blank
+    }
+    if missing:
+        errors.append(f"Colonnes manquantes : {', '.join(sorted(missing))}")
+    if errors:
+        raise ValidationError(errors)
+
+    tour = model(**values)
+    tour.license_plate = tour.license_plate.upper()
+    tour.set_durations(breaks)
+    return tour, breaks, shd
+
+
+def insert_batch(model, batch):
+    """
+    Insert a batch of tours with their breaks and SHD entries, in three queries
+    """
+    content_type = ContentType.objects.get_for_model(model)
+    with transaction.atomic():
+        tours = model.objects.bulk_create([tour for _, tour, _, _ in batch])
+        BreakTime.objects.bulk_create(
+            BreakTime(content_type=content_type, object_id=tour.pk, start_time=start, end_time=end)
+            for tour, (_, _, breaks, _) in zip(tours, batch)
+            for start, end in breaks
+        )
+        SHDEntry.objects.bulk_create(
+            SHDEntry(gls=tour, number=number, value=value)
+            for tour, (_, _, _, shd) in zip(tours, batch)
+            for number, value in enumerate(shd, start=1)
+        )
+    return tours
+
+
+def import_tours(model, lines, users=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import the tours of a CSV file
+
+    Args:
+        model: The tour model
+        lines: The lines of the file, as an iterable of strings
+        users: The usernames allowed in the file mapped to the user ids, every user
+            by default
+        batch_size: The number of tours inserted at once
+
+    Returns:
+        ImportResult: The number of tours created and the errors of the lines
+    """
+    if users is None:
+        users = dict(get_user_model().objects.values_list("username", "pk"))
+    columns = get_import_fields(model)
+    result = ImportResult()
+    months = set()
+    batch = []
+
+    def flush():
+        try:
+            result.created += len(insert_batch(model, batch))
+        except DatabaseError as error:
+            result.errors.extend((line, str(error)) for line, _, _, _ in batch)
+        else:
+            months.update((tour.date.year, tour.date.month) for _, tour, _, _ in batch)
+        batch.clear()
+
+    reader = csv.DictReader(lines)
+    try:
+        for row in reader:
+            try:
+                tour, breaks, shd = read_tour(model, columns, users, row)
+            except ValidationError as error:
+                result.errors.append((reader.line_num, " ; ".join(error.messages)))
+                continue
+            batch.append((reader.line_num, tour, breaks, shd))
+            if len(batch) >= batch_size:
+                flush()
+    except UnicodeDecodeError:
+        result.errors.append((None, "Fichier illisible : le fichier doit être encodé en UTF-8"))
+    except csv.Error as error:
+        result.errors.append((None, f"Fichier CSV invalide : {error}"))
+    if batch:
+        flush()
+
+    if result.created:
+        carrier = get_carrier(model)
+        for year, month in months:
+            invalidate_month(carrier.code, year, month)
+        invalidate_choices(model)
+    return result
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from xnbtd.tours.models import CARRIER_MODELS, update_durations
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored break and worked durations of the tours"
+
+    def add_arguments(self, parser):
+        # No choices: argparse rejects an empty list against them before Python 3.12
+        parser.add_argument(
+            "carriers",
+            nargs="*",
+            help=f"Carriers of the tours, all of them by default: {', '.join(CARRIER_MODELS)}",
+        )
+        parser.add_argument("--start", help="First day of the tours, YYYY-MM-DD")
+        parser.add_argument("--end", help="Last day of the tours, YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        unknown = [code for code in options["carriers"] if code not in CARRIER_MODELS]
+        if unknown:
+            raise CommandError(f"Unknown carriers: {', '.join(unknown)}")
+
+        for code in options["carriers"] or CARRIER_MODELS:
+            queryset = CARRIER_MODELS[code].objects.all()
+            if options["start"]:
+                queryset = queryset.filter(date__gte=options["start"])
+            if options["end"]:
+                queryset = queryset.filter(date__lte=options["end"])
+            update_durations(queryset)
+            self.stdout.write(f"{code}: durations of {queryset.count()} tours updated")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from xnbtd.analytics.pricing import CARRIERS
+from xnbtd.tours.importer import IMPORT_BATCH_SIZE, import_tours
+
+
+class Command(BaseCommand):
+    help = "Import tours from a CSV file, inserted by batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("carrier", choices=sorted(CARRIERS), help="Carrier of the tours")
+        parser.add_argument("path", help="Path of the CSV file")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Number of tours inserted at once",
+        )
+
+    def handle(self, *args, **options):
+        model = CARRIERS[options["carrier"]].model
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as lines:
+                result = import_tours(model, lines, batch_size=options["batch_size"])
+        except OSError as error:
+            raise CommandError(error)
+
+        for line, message in result.errors:
+            self.stderr.write(f"Line {line}: {message}")
+        self.stdout.write(f"{result.created} tours imported, {len(result.errors)} lines rejected")
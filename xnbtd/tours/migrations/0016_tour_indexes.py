@@ -0,0 +1,101 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0015_hide_avp_relay_add_picked_points"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chronopostdelivery",
+            index=models.Index(
+                fields=["linked_user", "date"], name="tours_cpdel_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chronopostdelivery",
+            index=models.Index(
+                fields=["date", "name"], name="tours_cpdel_date_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chronopostdelivery",
+            index=models.Index(
+                fields=["license_plate", "date"], name="tours_cpdel_plate_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chronopostpickup",
+            index=models.Index(
+                fields=["linked_user", "date"], name="tours_cppick_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chronopostpickup",
+            index=models.Index(
+                fields=["date", "name"], name="tours_cppick_date_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chronopostpickup",
+            index=models.Index(
+                fields=["license_plate", "date"], name="tours_cppick_plate_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ciblex",
+            index=models.Index(
+                fields=["linked_user", "date"], name="tours_ciblex_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ciblex",
+            index=models.Index(
+                fields=["date", "name"], name="tours_ciblex_date_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ciblex",
+            index=models.Index(
+                fields=["license_plate", "date"], name="tours_ciblex_plate_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="gls",
+            index=models.Index(
+                fields=["linked_user", "date"], name="tours_gls_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="gls",
+            index=models.Index(fields=["date", "name"], name="tours_gls_date_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="gls",
+            index=models.Index(
+                fields=["license_plate", "date"], name="tours_gls_plate_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tnt",
+            index=models.Index(
+                fields=["linked_user", "date"], name="tours_tnt_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tnt",
+            index=models.Index(fields=["date", "name"], name="tours_tnt_date_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tnt",
+            index=models.Index(
+                fields=["license_plate", "date"], name="tours_tnt_plate_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from xnbtd.fulltext import create_fulltext_index, drop_fulltext_index
+
+
+TOUR_MODELS = ["gls", "chronopostdelivery", "chronopostpickup", "tnt", "ciblex"]
+
+
+def create_indexes(apps, schema_editor):
+    for model_name in TOUR_MODELS:
+        model = apps.get_model("tours", model_name)
+        create_fulltext_index(schema_editor, model._meta.db_table, "comments")
+
+
+def drop_indexes(apps, schema_editor):
+    for model_name in TOUR_MODELS:
+        model = apps.get_model("tours", model_name)
+        drop_fulltext_index(schema_editor, model._meta.db_table, "comments")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tours", "0016_tour_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
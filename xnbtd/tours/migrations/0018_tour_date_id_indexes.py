@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0017_comments_fulltext"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chronopostdelivery",
+            index=models.Index(fields=["date", "id"], name="tours_cpdel_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="chronopostpickup",
+            index=models.Index(fields=["date", "id"], name="tours_cppick_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="ciblex",
+            index=models.Index(fields=["date", "id"], name="tours_ciblex_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="gls",
+            index=models.Index(fields=["date", "id"], name="tours_gls_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tnt",
+            index=models.Index(fields=["date", "id"], name="tours_tnt_date_id_idx"),
+        ),
+    ]
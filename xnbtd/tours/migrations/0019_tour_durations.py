@@ -0,0 +1,150 @@
+# Generated by Django 5.0.14 on 2026-10-17 15:29
+
+from django.db import migrations, models
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import (
+    Coalesce,
+    ExtractHour,
+    ExtractMinute,
+    ExtractSecond,
+    Floor,
+)
+from django.db.models.lookups import LessThan
+
+from xnbtd.fulltext import create_fulltext_index
+
+
+TOUR_MODELS = ["gls", "chronopostdelivery", "chronopostpickup", "tnt", "ciblex"]
+
+
+def create_indexes(apps, schema_editor):
+    # SQLite rebuilds the tables to add the columns, dropping the full-text triggers
+    for model_name in TOUR_MODELS:
+        model = apps.get_model("tours", model_name)
+        create_fulltext_index(schema_editor, model._meta.db_table, "comments")
+
+
+def seconds_between(start, end):
+    # Frozen copy of xnbtd.statistics.worked_seconds()
+    def seconds(field):
+        return ExtractHour(field) * 3600 + ExtractMinute(field) * 60 + ExtractSecond(field)
+
+    duration = seconds(end) - seconds(start)
+    return Case(
+        When(LessThan(F(end), F(start)), then=duration + 24 * 3600),
+        default=duration,
+        output_field=IntegerField(),
+    )
+
+
+def floor_minutes(seconds):
+    return Floor(seconds / 60, output_field=IntegerField())
+
+
+def fill_durations(apps, schema_editor):
+    BreakTime = apps.get_model("tours", "BreakTime")
+    for model_name in TOUR_MODELS:
+        model = apps.get_model("tours", model_name)
+        break_seconds = (
+            BreakTime.objects.filter(
+                content_type__app_label="tours",
+                content_type__model=model_name,
+                object_id=OuterRef("pk"),
+            )
+            .order_by()
+            .values("object_id")
+            .annotate(total=Sum(seconds_between("start_time", "end_time")))
+            .values("total")
+        )
+        model.objects.update(
+            break_minutes=floor_minutes(
+                Coalesce(Subquery(break_seconds), 0, output_field=IntegerField())
+            )
+        )
+        model.objects.update(
+            worked_minutes=floor_minutes(seconds_between("beginning_hour", "ending_hour"))
+            - F("break_minutes")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0018_tour_date_id_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_indexes),
+        migrations.AddField(
+            model_name="chronopostdelivery",
+            name="break_minutes",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="minutes de pause"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chronopostdelivery",
+            name="worked_minutes",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="minutes travaillées"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chronopostpickup",
+            name="break_minutes",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="minutes de pause"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chronopostpickup",
+            name="worked_minutes",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="minutes travaillées"
+            ),
+        ),
+        migrations.AddField(
+            model_name="ciblex",
+            name="break_minutes",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="minutes de pause"
+            ),
+        ),
+        migrations.AddField(
+            model_name="ciblex",
+            name="worked_minutes",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="minutes travaillées"
+            ),
+        ),
+        migrations.AddField(
+            model_name="gls",
+            name="break_minutes",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="minutes de pause"
+            ),
+        ),
+        migrations.AddField(
+            model_name="gls",
+            name="worked_minutes",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="minutes travaillées"
+            ),
+        ),
+        migrations.AddField(
+            model_name="tnt",
+            name="break_minutes",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="minutes de pause"
+            ),
+        ),
+        migrations.AddField(
+            model_name="tnt",
+            name="worked_minutes",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="minutes travaillées"
+            ),
+        ),
+        migrations.RunPython(fill_durations, migrations.RunPython.noop),
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,76 @@
 from django.contrib.auth.models import User
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Floor
 from django.utils import formats
 
+from xnbtd.statistics import worked_seconds
+
+
+def tour_indexes(prefix):
+    """
+    Indexes matching how the admin reads the tour tables: scoped to a driver and
+    drilled down by date, or filtered on the tour number or the license plate,
+    and paginated newest first on (date, id)
+    """
+    return [
+        models.Index(fields=["linked_user", "date"], name=f"{prefix}_user_date_idx"),
+        models.Index(fields=["date", "id"], name=f"{prefix}_date_id_idx"),
+        models.Index(fields=["date", "name"], name=f"{prefix}_date_name_idx"),
+        models.Index(fields=["license_plate", "date"], name=f"{prefix}_plate_date_idx"),
+    ]
+
+
+def seconds_between(start, end):
+    """
+    Seconds from a time of day to another, the end being on the next day when it is
+    before the start, as computed by ``worked_seconds()``
+    """
+    seconds = (
+        (end.hour - start.hour) * 3600
+        + (end.minute - start.minute) * 60
+        + end.second
+        - start.second
+    )
+    return seconds + 24 * 3600 if seconds < 0 else seconds
+
+
+def floor_minutes(seconds):
+    """
+    Whole minutes of a duration in seconds, rounded down like ``//`` in Python: a
+    bare division would round on PostgreSQL, where the seconds are not integers
+    """
+    return Floor(seconds / 60, output_field=IntegerField())
+
+
+def update_durations(queryset, breaks=None):
+    """
+    Store the break and worked durations of tours from their saved breaks, in two
+    UPDATE queries whatever the number of tours
+
+    Args:
+        queryset: The tours to update
+        breaks: The BreakTime queryset of the tour model, looked up by default
+    """
+    if breaks is None:
+        content_type = ContentType.objects.get_for_model(queryset.model)
+        breaks = BreakTime.objects.filter(content_type=content_type)
+    break_seconds = (
+        breaks.filter(object_id=OuterRef("pk"))
+        .order_by()
+        .values("object_id")
+        .annotate(total=Sum(worked_seconds("start_time", "end_time")))
+        .values("total")
+    )
+    queryset.update(
+        break_minutes=floor_minutes(
+            Coalesce(Subquery(break_seconds), 0, output_field=IntegerField())
+        )
+    )
+    queryset.update(worked_minutes=floor_minutes(worked_seconds()) - F("break_minutes"))
+
 
 class BaseModel(models.Model):
     linked_user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="livreur")
@@ -13,9 +80,37 @@ class BaseModel(models.Model):
     ending_hour = models.TimeField(verbose_name="fin de la journée")
     license_plate = models.CharField(max_length=7, verbose_name="Plaque d'immatriculation")
     comments = models.TextField(verbose_name="Commentaires", null=True, blank=True)
+    breaks = GenericRelation("tours.BreakTime", verbose_name="pauses")
+    # Stored for the hours reports, see set_durations() and update_durations(), the
+    # latter being called when a break is saved or deleted (see xnbtd.tours.signals)
+    break_minutes = models.PositiveIntegerField(
+        verbose_name="minutes de pause", default=0, editable=False
+    )
+    worked_minutes = models.IntegerField(
+        verbose_name="minutes travaillées", default=0, editable=False
+    )
+
+    def set_durations(self, breaks=None):
+        """
+        Compute the stored durations of the tour, without query
+
+        Args:
+            breaks: The ``(start_time, end_time)`` pairs of the breaks of the tour, the
+                current break duration being kept when not given
+        """
+        if breaks is not None:
+            self.break_minutes = sum(seconds_between(start, end) for start, end in breaks) // 60
+        self.worked_minutes = (
+            seconds_between(self.beginning_hour, self.ending_hour) // 60 - self.break_minutes
+        )
 
     def save(self, *args, **kwargs):
         self.license_plate = self.license_plate.upper()
+        breaks = None
+        if self.pk is not None and not self._state.adding:
+            # The breaks may have changed since the tour was loaded
+            breaks = list(self.breaks.values_list("start_time", "end_time"))
+        self.set_durations(breaks)
         super(BaseModel, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -44,6 +139,31 @@ class GLS(BaseModel):
     class Meta:
         verbose_name = "GLS"
         verbose_name_plural = "GLS"
+        indexes = tour_indexes("tours_gls")
+
+
+class SHDEntryManager(models.Manager):
+    def allocate_numbers(self, gls, count):
+        """
+        Reserve the next SHD numbers of a GLS tour
+
+        The tour row is locked until the end of the transaction, so a concurrent
+        save of the same tour waits instead of getting the same numbers: this must
+        be called in a transaction which inserts the entries. The last number is
+        read by a second statement, once the lock is held: on PostgreSQL in READ
+        COMMITTED, a statement started before the wait would not see the entries
+        committed meanwhile.
+
+        Args:
+            gls: The GLS tour
+            count: The number of entries to number
+
+        Returns:
+            range: The numbers to give to the new entries
+        """
+        GLS.objects.select_for_update().filter(pk=gls.pk).values_list("pk").get()
+        last = self.filter(gls=gls).aggregate(last=Max("number"))["last"] or 0
+        return range(last + 1, last + count + 1)
 
 
 class SHDEntry(models.Model):
@@ -53,11 +173,15 @@ class SHDEntry(models.Model):
     number = models.PositiveIntegerField(verbose_name="SHD", editable=False)
     value = models.IntegerField(verbose_name="valeur")
 
+    objects = SHDEntryManager()
+
     def save(self, *args, **kwargs):
-        if not self.number:
-            last_shd = SHDEntry.objects.filter(gls=self.gls).order_by('-number').first()
-            self.number = (last_shd.number + 1) if last_shd else 1
-        super().save(*args, **kwargs)
+        if self.number:
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            self.number = SHDEntry.objects.allocate_numbers(self.gls, 1)[0]
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"SHD {self.number}: {self.value}"
@@ -84,6 +208,7 @@ class ChronopostDelivery(BaseModel):
     class Meta:
         verbose_name = "Chronopost - Livraison"
         verbose_name_plural = "Chronopost - Livraison"
+        indexes = tour_indexes("tours_cpdel")
 
 
 class ChronopostPickup(BaseModel):
@@ -94,6 +219,7 @@ class ChronopostPickup(BaseModel):
     class Meta:
         verbose_name = "Chronopost - Ramasse"
         verbose_name_plural = "Chronopost - Ramasse"
+        indexes = tour_indexes("tours_cppick")
 
 
 class TNT(BaseModel):
@@ -110,6 +236,7 @@ class TNT(BaseModel):
     class Meta:
         verbose_name = "TNT - Fedex"
         verbose_name_plural = "TNT - Fedex"
+        indexes = tour_indexes("tours_tnt")
 
 
 class Ciblex(BaseModel):
@@ -125,6 +252,21 @@ class Ciblex(BaseModel):
     class Meta:
         verbose_name = "Ciblex"
         verbose_name_plural = "Ciblex"
+        indexes = tour_indexes("tours_ciblex")
+
+
+# The tour model of each carrier, by carrier code. The pricing, the exports, the
+# compliance checks and the cache invalidation read the tours of every carrier
+# from here, so a new carrier is only added once.
+CARRIER_MODELS = {
+    "gls": GLS,
+    "chronopost_delivery": ChronopostDelivery,
+    "chronopost_pickup": ChronopostPickup,
+    "tnt": TNT,
+    "ciblex": Ciblex,
+}
+
+TOUR_MODELS = list(CARRIER_MODELS.values())
 
 
 class BreakTime(models.Model):
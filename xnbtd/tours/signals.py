@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save
+
+from xnbtd.tours.filters import invalidate_choices
+from xnbtd.tours.models import TOUR_MODELS, BreakTime, update_durations
+
+
+def invalidate_tour_choices(sender, **kwargs):
+    invalidate_choices(sender)
+
+
+def invalidate_driver_choices(sender, update_fields=None, **kwargs):
+    # The driver filters show the username of each driver, which a login does not change
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    for model in TOUR_MODELS:
+        invalidate_choices(model)
+
+
+def update_tour_durations(sender, instance, raw=False, **kwargs):
+    # The breaks saved or deleted anywhere, also by the admin inlines and with their tour
+    if raw:
+        return
+    model = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+    if model in TOUR_MODELS:
+        update_durations(model.objects.filter(pk=instance.object_id))
+
+
+post_save.connect(update_tour_durations, sender=BreakTime)
+post_delete.connect(update_tour_durations, sender=BreakTime)
+
+for model in TOUR_MODELS:
+    post_save.connect(invalidate_tour_choices, sender=model)
+    post_delete.connect(invalidate_tour_choices, sender=model)
+
+post_save.connect(invalidate_driver_choices, sender=get_user_model())
+post_delete.connect(invalidate_driver_choices, sender=get_user_model())
@@ -0,0 +1,677 @@
+import csv
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qsl
+
+from django.contrib import admin
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.forms.models import inlineformset_factory
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from xnbtd.analytics.models import Expense
+from xnbtd.fulltext import _available, fulltext_available
+from xnbtd.statistics import compute_statistics, worked_seconds
+from xnbtd.tests_utils import (
+    create_chronopost_delivery,
+    create_chronopost_pickup,
+    create_ciblex,
+    create_gls,
+    create_tnt,
+)
+
+from .admin import SHDEntryFormSet
+from .importer import import_tours
+from .models import GLS, TNT, TOUR_MODELS, BreakTime, SHDEntry, update_durations
+
+
+class DurationStatisticsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver', password='driverpassword')
+        create_tnt(self.user)
+        create_tnt(self.user, beginning_hour=time(22, 0), ending_hour=time(2, 15))
+
+    def test_time_columns_are_summed_in_hours(self):
+        """Test TimeField statistics are summed as durations by the database"""
+        with self.assertNumQueries(1):
+            statistics = compute_statistics(
+                TNT.objects.all(),
+                [('beginning_hour', 'Début'), (worked_seconds(), 'Heures', 'hours')],
+            )
+        self.assertEqual(statistics, [('Début', 29.0), ('Heures', 12.75)])
+
+    def test_time_columns_without_data(self):
+        """Test an empty queryset gives no duration total"""
+        statistics = compute_statistics(TNT.objects.none(), [('ending_hour', 'Fin')])
+        self.assertEqual(statistics, [('Fin', None)])
+
+
+class ChangelistQueriesTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+
+    def create_tours_with_breaks(self, count):
+        for _ in range(count):
+            tour = create_tnt(self.admin_user)
+            BreakTime.objects.create(
+                content_type=ContentType.objects.get_for_model(tour),
+                object_id=tour.pk,
+                start_time=time(12, 0),
+                end_time=time(12, 45),
+            )
+
+    def get_changelist_queries(self):
+        url = reverse('admin:tours_tnt_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '12:00 - 12:45')
+        return len(context.captured_queries)
+
+    def test_breaks_query_count_does_not_depend_on_rows(self):
+        """Test the breaks of a changelist page are loaded in a single query"""
+        self.create_tours_with_breaks(1)
+        queries_for_one_row = self.get_changelist_queries()
+
+        self.create_tours_with_breaks(10)
+        self.assertEqual(self.get_changelist_queries(), queries_for_one_row)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The query plans are checked with SQLite')
+class QueryPlanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver', password='driverpassword')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_tour_indexes(self):
+        """Test the admin access paths on the tour tables use the composite indexes"""
+        this_month = {'date__gte': date(2024, 3, 1), 'date__lte': date(2024, 3, 31)}
+        self.assertUsesIndex(
+            GLS.objects.filter(linked_user=self.user, **this_month), 'tours_gls_user_date_idx'
+        )
+        self.assertUsesIndex(
+            TNT.objects.filter(date=date(2024, 3, 4), name='T1'), 'tours_tnt_date_name_idx'
+        )
+        self.assertUsesIndex(
+            TNT.objects.filter(license_plate='AB123CD', **this_month), 'tours_tnt_plate_date_idx'
+        )
+
+
+class TypedSearchTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+        self.first = create_tnt(self.admin_user, name='1042', comments='Client absent')
+        self.second = create_tnt(
+            self.admin_user,
+            name='T2',
+            date=date(2024, 4, 10),
+            beginning_hour=time(6, 30),
+            license_plate='zz999zz',
+            totals_clients=42,
+        )
+
+    def search(self, term):
+        response = self.client.get(reverse('admin:tours_tnt_changelist'), {'q': term}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return set(response.context['cl'].queryset)
+
+    def test_numeric_terms_match_counters_exactly(self):
+        """Test a number matches the counters and the tour number exactly"""
+        self.assertEqual(self.search('42'), {self.second})
+        self.assertEqual(self.search('1042'), {self.first})
+        self.assertEqual(self.search('2024'), {self.first, self.second})
+
+    def test_numbers_out_of_the_integer_range(self):
+        """Test a number too large for the counters only matches the tour number"""
+        self.assertEqual(self.search('9223372036854775808'), set())
+        self.assertEqual(self.search('99999999999999999999'), set())
+        TNT.objects.filter(pk=self.first.pk).update(name='99999999999999999999')
+        self.assertEqual(self.search('99999999999999999999'), {self.first})
+
+    def test_date_terms_become_ranges(self):
+        """Test dates and months are matched as date ranges"""
+        self.assertEqual(self.search('04/03/2024'), {self.first})
+        self.assertEqual(self.search('2024-04-10'), {self.second})
+        self.assertEqual(self.search('04/2024'), {self.second})
+        self.assertEqual(self.search('06:30'), {self.second})
+
+    def test_text_terms_only_reach_text_columns(self):
+        """Test text terms are searched in the text columns, without casting the counters"""
+        self.assertEqual(self.search('absent'), {self.first})
+        self.assertEqual(self.search('ZZ999'), {self.second})
+        self.assertEqual(self.search('"client absent" 1042'), {self.first})
+
+        model_admin = admin.site._registry[TNT]
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        queryset, _ = model_admin.get_search_results(request, TNT.objects.all(), 'absent')
+        where = str(queryset.query).split('WHERE', 1)[1]
+        self.assertIn('tours_tnt_fts', where)
+        self.assertNotIn('"totals_clients"', where)
+        self.assertNotIn('"date"', where)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The FTS5 index is checked with SQLite')
+class FullTextSearchTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+        if not fulltext_available(TNT):
+            self.skipTest('SQLite is built without FTS5')
+
+    def search(self, model, term):
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        response = self.client.get(url, {'q': term}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return set(response.context['cl'].queryset)
+
+    def test_comments_index_follows_the_tours(self):
+        """Test the index of the comments is kept in sync by the triggers"""
+        tour = create_tnt(self.admin_user, comments='Client absent, colis déposé en relais')
+        create_tnt(self.admin_user, comments='RAS')
+        self.assertEqual(self.search(TNT, 'absen'), {tour})
+        self.assertEqual(self.search(TNT, '"colis relais"'), {tour})
+
+        tour.comments = 'Portail fermé'
+        tour.save()
+        self.assertEqual(self.search(TNT, 'absent'), set())
+        self.assertEqual(self.search(TNT, 'portail'), {tour})
+
+        tour.delete()
+        self.assertEqual(self.search(TNT, 'portail'), set())
+
+    def test_expense_titles_are_indexed(self):
+        """Test the expense titles are searched with their full-text index"""
+        expense = Expense.objects.create(
+            title='Vidange et pneus',
+            license_plate='AB123CD',
+            amount=250,
+            date=date(2024, 3, 4),
+            linked_user=self.admin_user,
+        )
+        other = Expense.objects.create(
+            title='Péage',
+            license_plate='AB123CD',
+            amount=Decimal('250.75'),
+            date=date(2024, 3, 4),
+            linked_user=self.admin_user,
+        )
+        self.assertTrue(fulltext_available(Expense))
+        self.assertEqual(self.search(Expense, 'pneu'), {expense})
+        self.assertEqual(self.search(Expense, '250'), {expense})
+        self.assertEqual(self.search(Expense, '250.75'), {other})
+        self.assertEqual(self.search(Expense, '250,75'), {other})
+
+    def test_missing_triggers_fall_back_to_icontains(self):
+        """Test the index is not used once a migration has dropped its triggers"""
+        tour = create_tnt(self.admin_user, comments='Client absent')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER tours_tnt_fts_update')
+        _available.clear()
+        self.addCleanup(_available.clear)
+        self.assertFalse(fulltext_available(TNT))
+
+        tour.comments = 'Portail fermé'
+        tour.save()
+        self.assertEqual(self.search(TNT, 'portail'), {tour})
+        self.assertEqual(self.search(TNT, 'absent'), set())
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+        cache.clear()
+        # Two tours a day, from the 1st to the 5th of March
+        self.tours = [
+            create_tnt(self.admin_user, date=date(2024, 3, day))
+            for day in range(1, 6)
+            for _ in range(2)
+        ]
+        model_admin = admin.site._registry[TNT]
+        patcher = mock.patch.multiple(model_admin, keyset_pagination=True, list_per_page=3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_page(self, params=None):
+        url = reverse('admin:tours_tnt_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'], context.captured_queries
+
+    def cursor_params(self, url):
+        return dict(parse_qsl(url.lstrip('?')))
+
+    def test_pages_seek_on_date_and_id(self):
+        """Test the pages follow each other newest first, without OFFSET"""
+        newest_first = sorted(self.tours, key=lambda tour: (tour.date, tour.pk), reverse=True)
+        cl, _ = self.get_page()
+        self.assertEqual(cl.result_list, newest_first[:3])
+        self.assertIsNone(cl.previous_url)
+        self.assertEqual(cl.result_count, 10)
+
+        pages = [cl.result_list]
+        while cl.next_url:
+            cl, queries = self.get_page(self.cursor_params(cl.next_url))
+            pages.append(cl.result_list)
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+        self.assertEqual([tour for page in pages for tour in page], newest_first)
+
+        previous, _ = self.get_page(self.cursor_params(cl.previous_url))
+        self.assertEqual(previous.result_list, pages[-2])
+
+    def test_invalid_cursors_show_the_first_page(self):
+        """Test a malformed cursor or an id out of the primary key range is ignored"""
+        first, _ = self.get_page()
+        for cursor in ('garbage', '2024-13-01.1', '2024-03-05.99999999999999999999'):
+            cl, _ = self.get_page({'after': cursor})
+            self.assertEqual(cl.result_list, first.result_list)
+
+    def test_counts_are_cached(self):
+        """Test the row count is not computed again for every page"""
+        cl, _ = self.get_page()
+        _, queries = self.get_page(self.cursor_params(cl.next_url))
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+    def test_sorted_changelist_uses_django_pagination(self):
+        """Test sorting on a column falls back to the pages of Django"""
+        cl, _ = self.get_page({'o': '1'})
+        self.assertFalse(cl.keyset)
+        self.assertEqual(cl.paginator.num_pages, 4)
+
+
+class CachedFiltersTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+        cache.clear()
+        create_tnt(self.admin_user)
+
+    def get_changelist(self):
+        url = reverse('admin:tours_tnt_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        # The date hierarchy has its own DISTINCT query on the dates
+        distinct_queries = [
+            query['sql']
+            for query in context.captured_queries
+            if 'DISTINCT' in query['sql'] and 'datefield' not in query['sql']
+        ]
+        return response, distinct_queries
+
+    def test_choices_are_served_from_the_cache(self):
+        """Test the filter choices are computed once, then read from the cache"""
+        response, distinct_queries = self.get_changelist()
+        self.assertTrue(distinct_queries)
+        self.assertContains(response, '?license_plate=AB123CD')
+
+        response, distinct_queries = self.get_changelist()
+        self.assertEqual(distinct_queries, [])
+        self.assertContains(response, '?license_plate=AB123CD')
+
+    def test_saving_a_tour_refreshes_the_choices(self):
+        """Test a new license plate appears in the filter once its tour is saved"""
+        self.get_changelist()
+        create_tnt(self.admin_user, name='T9', license_plate='zz999zz')
+        response, distinct_queries = self.get_changelist()
+        self.assertTrue(distinct_queries)
+        self.assertContains(response, '?license_plate=ZZ999ZZ')
+        self.assertContains(response, '?name=T9')
+
+    def test_login_keeps_the_choices(self):
+        """Test a login, which only saves the last login date, keeps the cached choices"""
+        self.get_changelist()
+        self.client.login(username='admin', password='adminpassword')
+        _, distinct_queries = self.get_changelist()
+        self.assertEqual(distinct_queries, [])
+
+        self.admin_user.first_name = 'Admin'
+        self.admin_user.save()
+        _, distinct_queries = self.get_changelist()
+        self.assertTrue(distinct_queries)
+
+    def test_drivers_only_see_their_own_choices(self):
+        """Test the choices are cached per scope, a driver only listing their own values"""
+        driver = User.objects.create_user(username='driver', password='driverpassword')
+        driver.user_permissions.add(*Permission.objects.filter(codename='view_tnt'))
+        driver.is_staff = True
+        driver.save()
+        create_tnt(driver, license_plate='dr111dr')
+        self.get_changelist()
+
+        self.client.login(username='driver', password='driverpassword')
+        response, _ = self.get_changelist()
+        self.assertContains(response, '?license_plate=DR111DR')
+        self.assertNotContains(response, '?license_plate=AB123CD')
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.client.login(username='admin', password='adminpassword')
+
+    def test_export_action_streams_the_rows(self):
+        """Test the export action streams the tours with their driver and breaks"""
+        tours = [create_tnt(self.admin_user, name=f'T{number}') for number in range(3)]
+        BreakTime.objects.create(
+            content_type=ContentType.objects.get_for_model(TNT),
+            object_id=tours[0].pk,
+            start_time=time(12, 0),
+            end_time=time(12, 45),
+        )
+        response = self.client.post(
+            reverse('admin:tours_tnt_changelist'),
+            {'action': 'export_route_as_csv', '_selected_action': [tour.pk for tour in tours]},
+            secure=True,
+        )
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(2):
+            rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertIn('Pauses', rows[0])
+        self.assertTrue(any('12:00 - 12:45' in cell for row in rows[1:] for cell in row))
+        self.assertEqual({row[rows[0].index('livreur')] for row in rows[1:]}, {'admin'})
+
+
+class ImportTest(TestCase):
+    header = (
+        'livreur,name,date,beginning_hour,ending_hour,license_plate,points_charges,'
+        'points_delivered,packages_charges,packages_delivered,eo,pickup_point,full_km,pauses,shd\n'
+    )
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+
+    def gls_lines(self, count, username='admin'):
+        line = f'{username},G1,2024-05-02,07:00,16:00,ab123cd,1,2,3,4,5,6,7,12:00 - 12:45,3;1\n'
+        return StringIO(self.header + line * count)
+
+    def test_import_inserts_by_batches(self):
+        """Test the tours, breaks and SHD entries are inserted in a fixed number of queries"""
+        with CaptureQueriesContext(connection) as small:
+            import_tours(GLS, self.gls_lines(2))
+        with CaptureQueriesContext(connection) as large:
+            result = import_tours(GLS, self.gls_lines(40))
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual((result.created, result.errors), (40, []))
+
+        tour = GLS.objects.last()
+        self.assertEqual(tour.license_plate, 'AB123CD')
+        self.assertEqual(tour.packages_delivered, 4)
+        self.assertEqual(
+            [(entry.number, entry.value) for entry in tour.shd_entries.all()], [(1, 3), (2, 1)]
+        )
+        self.assertEqual([str(pause.start_time) for pause in tour.breaks.all()], ['12:00:00'])
+        self.assertEqual((tour.break_minutes, tour.worked_minutes), (45, 495))
+
+    def test_invalid_lines_are_reported(self):
+        """Test an invalid line is reported with its number without stopping the import"""
+        lines = self.gls_lines(1).getvalue()
+        lines += 'nobody,G2,2024-05-02,07:00,16:00,ab123cd,1,2,3,4,5,6,7,,\n'
+        lines += 'admin,G3,not a date,07:00,16:00,ab123cd,1,2,3,x,5,6,7,,\n'
+        lines += 'admin,G4,2024-05-03,07:00,16:00,ab123cd,1,2,3,4,5,6,7,,\n'
+        result = import_tours(GLS, StringIO(lines))
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+        self.assertIn('nobody', result.errors[0][1])
+        self.assertIn('date', result.errors[1][1])
+        self.assertIn('packages_delivered', result.errors[1][1])
+
+    def test_exported_file_can_be_imported(self):
+        """Test the file of the CSV export is imported back"""
+        tour = create_tnt(self.admin_user)
+        BreakTime.objects.create(
+            content_type=ContentType.objects.get_for_model(TNT),
+            object_id=tour.pk,
+            start_time=time(12, 0),
+            end_time=time(12, 45),
+        )
+        self.client.login(username='admin', password='adminpassword')
+        response = self.client.post(
+            reverse('admin:tours_tnt_changelist'),
+            {'action': 'export_route_as_csv', '_selected_action': [tour.pk]},
+            secure=True,
+        )
+        content = b''.join(response.streaming_content).decode()
+        result = import_tours(TNT, StringIO(content))
+        self.assertEqual((result.created, result.errors), (1, []))
+        imported = TNT.objects.exclude(pk=tour.pk).get()
+        self.assertEqual(imported.totals_clients, tour.totals_clients)
+        self.assertEqual(imported.breaks.count(), 1)
+
+    def test_drivers_only_import_their_own_tours(self):
+        """Test the admin view rejects the lines of another driver for a non superuser"""
+        driver = User.objects.create_user(
+            username='driver', password='driverpassword', is_staff=True
+        )
+        driver.user_permissions.add(
+            *Permission.objects.filter(codename__in=['add_gls', 'view_gls'])
+        )
+        self.client.login(username='driver', password='driverpassword')
+        upload = SimpleUploadedFile('tours.csv', self.gls_lines(1, 'admin').getvalue().encode())
+        response = self.client.post(
+            reverse('admin:tours_gls_import'), {'file': upload}, secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 0)
+        self.assertContains(response, 'Livreur inconnu')
+
+        upload = SimpleUploadedFile('tours.csv', self.gls_lines(2, 'driver').getvalue().encode())
+        response = self.client.post(
+            reverse('admin:tours_gls_import'), {'file': upload}, secure=True
+        )
+        self.assertEqual(response.context['result'].created, 2)
+        self.assertEqual(GLS.objects.filter(linked_user=driver).count(), 2)
+
+    def test_unreadable_file_is_reported(self):
+        """Test a Latin-1 file or a broken CSV is reported instead of failing the request"""
+        self.client.login(username='admin', password='adminpassword')
+        content = self.gls_lines(1).getvalue().replace('G1', 'Tournée')
+        upload = SimpleUploadedFile('tours.csv', content.encode('latin-1'))
+        response = self.client.post(
+            reverse('admin:tours_gls_import'), {'file': upload}, secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 0)
+        self.assertEqual(response.context['result'].errors[0][0], None)
+        self.assertContains(response, 'UTF-8')
+
+        # A cell over the field size limit of the csv module
+        result = import_tours(GLS, StringIO(self.header + 'admin,"' + 'x' * 200000 + '"\n'))
+        self.assertEqual(result.created, 0)
+        self.assertIn('CSV', result.errors[0][1])
+
+
+class SHDNumberingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver', password='driverpassword')
+        self.tour = create_gls(self.user)
+
+    def save_formset(self, values):
+        FormSet = inlineformset_factory(
+            GLS, SHDEntry, formset=SHDEntryFormSet, fields=['value'], extra=len(values)
+        )
+        data = {
+            'shd_entries-TOTAL_FORMS': len(values),
+            'shd_entries-INITIAL_FORMS': 0,
+        }
+        for index, value in enumerate(values):
+            data[f'shd_entries-{index}-value'] = value
+        formset = FormSet(data, instance=self.tour)
+        self.assertTrue(formset.is_valid(), formset.errors)
+        with CaptureQueriesContext(connection) as queries:
+            formset.save()
+        return queries
+
+    def test_entry_numbers_follow_the_last_one(self):
+        """Test a saved entry without number gets the number after the last one of its tour"""
+        SHDEntry.objects.create(gls=self.tour, number=4, value=1)
+        entry = SHDEntry.objects.create(gls=self.tour, value=2)
+        self.assertEqual(entry.number, 5)
+
+    def test_lock_is_taken_before_reading_the_last_number(self):
+        """Test the tour is locked by a first statement and the last number read by a second"""
+        SHDEntry.objects.create(gls=self.tour, number=3, value=1)
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                numbers = SHDEntry.objects.allocate_numbers(self.tour, 2)
+        self.assertEqual(list(numbers), [4, 5])
+        lock, read = [query['sql'] for query in queries.captured_queries]
+        self.assertIn('"tours_gls"', lock)
+        self.assertNotIn('tours_shdentry', lock)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', lock)
+        self.assertIn('"tours_shdentry"', read)
+        self.assertIn('MAX', read)
+
+    def test_formset_numbers_entries_at_once(self):
+        """Test the entries of a formset are numbered and inserted in a fixed number of queries"""
+        SHDEntry.objects.create(gls=self.tour, value=9)
+        small = self.save_formset([1, 2])
+        large = self.save_formset(list(range(30)))
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(
+            list(self.tour.shd_entries.order_by('number').values_list('number', flat=True)),
+            list(range(1, 34)),
+        )
+
+
+class StoredDurationsTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword'
+        )
+        self.tour = create_tnt(self.admin_user)
+
+    def add_break(self, tour, start, end):
+        BreakTime.objects.create(
+            content_type=ContentType.objects.get_for_model(TNT),
+            object_id=tour.pk,
+            start_time=start,
+            end_time=end,
+        )
+
+    def test_save_computes_worked_minutes(self):
+        """Test saving a tour stores its duration less its breaks, across midnight"""
+        self.assertEqual((self.tour.break_minutes, self.tour.worked_minutes), (0, 510))
+        night = create_tnt(self.admin_user, beginning_hour=time(22, 0), ending_hour=time(2, 15))
+        self.assertEqual(night.worked_minutes, 255)
+
+    def test_update_durations_reads_the_breaks(self):
+        """Test the durations of many tours are updated from their breaks in two queries"""
+        self.add_break(self.tour, time(12, 0), time(12, 45))
+        self.add_break(self.tour, time(23, 50), time(0, 5))
+        other = create_tnt(self.admin_user)
+        with self.assertNumQueries(2):
+            update_durations(TNT.objects.all())
+        self.tour.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.tour.break_minutes, self.tour.worked_minutes), (60, 450))
+        self.assertEqual((other.break_minutes, other.worked_minutes), (0, 510))
+
+        self.tour.save()
+        self.assertEqual(self.tour.worked_minutes, 450)
+
+    def test_stale_instance_keeps_the_stored_breaks(self):
+        """Test saving a tour loaded before its breaks changed counts the current breaks"""
+        stale = TNT.objects.get(pk=self.tour.pk)
+        self.add_break(self.tour, time(12, 0), time(12, 45))
+        stale.ending_hour = time(17, 0)
+        stale.save()
+        self.tour.refresh_from_db()
+        self.assertEqual((self.tour.break_minutes, self.tour.worked_minutes), (45, 555))
+
+    def test_breaks_saved_anywhere_update_the_tour(self):
+        """Test a break created, changed or deleted out of the admin updates its tour"""
+        self.add_break(self.tour, time(12, 0), time(12, 30))
+        self.tour.refresh_from_db()
+        self.assertEqual((self.tour.break_minutes, self.tour.worked_minutes), (30, 480))
+
+        pause = self.tour.breaks.get()
+        pause.end_time = time(13, 0)
+        pause.save()
+        self.tour.refresh_from_db()
+        self.assertEqual(self.tour.worked_minutes, 450)
+
+        pause.delete()
+        self.tour.refresh_from_db()
+        self.assertEqual((self.tour.break_minutes, self.tour.worked_minutes), (0, 510))
+
+    def test_admin_stores_the_inline_breaks(self):
+        """Test the breaks of the change form are counted once they are saved"""
+        self.client.login(username='admin', password='adminpassword')
+        prefix = 'tours-breaktime-content_type-object_id'
+        data = {
+            field.name: getattr(self.tour, field.attname)
+            for field in TNT._meta.concrete_fields
+            if field.editable and not field.primary_key and field.attname != 'comments'
+        }
+        data.update({
+            f'{prefix}-TOTAL_FORMS': 1,
+            f'{prefix}-INITIAL_FORMS': 0,
+            f'{prefix}-0-start_time': '12:00',
+            f'{prefix}-0-end_time': '12:30',
+        })
+        response = self.client.post(
+            reverse('admin:tours_tnt_change', args=[self.tour.pk]), data, secure=True
+        )
+        self.assertEqual(response.status_code, 302)
+        self.tour.refresh_from_db()
+        self.assertEqual((self.tour.break_minutes, self.tour.worked_minutes), (30, 480))
+
+    def test_backfill_command(self):
+        """Test the command fills the durations of the tours"""
+        self.add_break(self.tour, time(12, 0), time(12, 45))
+        call_command('backfill_durations', 'tnt', stdout=StringIO())
+        self.tour.refresh_from_db()
+        self.assertEqual(self.tour.worked_minutes, 465)
+
+    def test_backfill_command_defaults_to_every_carrier(self):
+        """Test the command without carrier fills the durations of the tours of all of them"""
+        tours = [
+            self.tour,
+            create_gls(self.admin_user),
+            create_chronopost_delivery(self.admin_user),
+            create_chronopost_pickup(self.admin_user),
+            create_ciblex(self.admin_user),
+        ]
+        self.assertEqual({type(tour) for tour in tours}, set(TOUR_MODELS))
+        for model in TOUR_MODELS:
+            model.objects.update(worked_minutes=0)
+
+        call_command('backfill_durations', stdout=StringIO())
+        for tour in tours:
+            tour.refresh_from_db()
+        self.assertEqual([tour.worked_minutes for tour in tours], [510, 540, 480, 300, 480])
+
+        with self.assertRaisesMessage(CommandError, 'Unknown carriers: dhl'):
+            call_command('backfill_durations', 'tnt', 'dhl', stdout=StringIO())
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 
 
 urlpatterns = [
+    path('exports/', include('xnbtd.analytics.urls')),
     path('', admin.site.urls),
 ]